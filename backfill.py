@@ -0,0 +1,88 @@
+"""One-off job filling events.event_ts / foreground_minutes for rows older than migration 004."""
+from __future__ import annotations
+
+import argparse
+import logging
+import time
+
+import db
+
+WATERMARK_SOURCE = "events_normalize"
+
+logger = logging.getLogger("backfill")
+
+_BACKFILL_QUERY = """
+    UPDATE public.events AS e
+    SET event_ts = COALESCE(
+            e.event_ts,
+            public.signal_event_ts(
+                e.last_time_used,
+                e.last_time_used_formatted,
+                e.date,
+                e.created_at,
+                e.updated_at
+            )
+        ),
+        foreground_minutes = COALESCE(
+            e.foreground_minutes,
+            public.signal_event_minutes(
+                e.total_time_in_foreground_minutes,
+                e.total_time_in_foreground,
+                e.total_time_in_foreground_ms
+            )
+        )
+    WHERE e.id > %s
+      AND e.id <= %s
+      AND (e.event_ts IS NULL OR e.foreground_minutes IS NULL)
+"""
+
+
+def backfill_batch(conn, *, batch_size: int = 10_000, source: str = WATERMARK_SOURCE) -> int:
+    """Normalise the next ``batch_size`` event ids and advance the watermark.
+
+    Returns the number of ids covered (0 once caught up). Rows whose raw columns hold
+    no usable timestamp keep a NULL ``event_ts``; the watermark means they are not
+    revisited.
+    """
+    with conn:
+        with conn.cursor() as cur:
+            last_id = db.lock_watermark(cur, source)
+            cur.execute(
+                """
+                SELECT max(id), count(*) FROM (
+                    SELECT id FROM public.events WHERE id > %s ORDER BY id LIMIT %s
+                ) AS pending
+                """,
+                (last_id, batch_size),
+            )
+            upper_id, covered = cur.fetchone()
+            if upper_id is None:
+                return 0
+
+            cur.execute(_BACKFILL_QUERY, (last_id, upper_id))
+            updated = cur.rowcount
+            db.advance_watermark(cur, source, upper_id)
+    logger.info("normalised %s of %s events up to id %s", updated, covered, upper_id)
+    return covered
+
+
+def run(*, batch_size: int, pause: float = 0.0) -> None:
+    with db.connection() as conn:
+        while backfill_batch(conn, batch_size=batch_size):
+            if pause:
+                time.sleep(pause)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--batch-size", type=int, default=10_000, help="event ids per transaction")
+    parser.add_argument("--pause", type=float, default=0.0, help="seconds to sleep between batches")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    db.configure_pool(1)
+    run(batch_size=args.batch_size, pause=args.pause)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+"""Benchmark harness: synthetic data generation (datagen) and latency measurement (run)."""
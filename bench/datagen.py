@@ -0,0 +1,292 @@
+"""Build a benchmark database from schema.sql and fill it with synthetic data.
+
+    python -m bench.datagen --database-url postgresql://localhost/signals_bench --reset \\
+        --users 2000 --events 1000000
+
+Users get a heavy-tailed (Pareto) share of the events, and a quarter of them stopped
+being active some weeks ago, so both the busy-user and drop-off paths are exercised.
+Event times use the same mix of encodings found in production: epoch milliseconds and
+seconds, formatted strings, dates, and rows carrying only created_at.
+"""
+from __future__ import annotations
+
+import argparse
+import io
+import random
+import subprocess
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Iterator, List, Sequence, Tuple
+from urllib.parse import urlsplit, urlunsplit
+
+import psycopg2
+
+ROOT = Path(__file__).resolve().parent.parent
+
+EVENT_COLUMNS = (
+    "user_id",
+    "event_type",
+    "package_name",
+    "session_id",
+    "last_time_used",
+    "last_time_used_formatted",
+    "date",
+    "total_time_in_foreground",
+    "total_time_in_foreground_minutes",
+    "total_time_in_foreground_ms",
+    "device_model",
+    "android_version",
+    "created_at",
+    "updated_at",
+)
+
+COPY_ROWS = 50_000
+
+
+def _maintenance_url(database_url: str) -> Tuple[str, str]:
+    parts = urlsplit(database_url)
+    name = parts.path.lstrip("/")
+    if not name:
+        raise SystemExit("--database-url must name a database")
+    return urlunsplit(parts._replace(path="/postgres")), name
+
+
+def reset_database(database_url: str) -> None:
+    """Drop and re-create the database named in ``database_url``."""
+    admin_url, name = _maintenance_url(database_url)
+    conn = psycopg2.connect(admin_url)
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f'DROP DATABASE IF EXISTS "{name}"')
+            cur.execute(f'CREATE DATABASE "{name}"')
+    finally:
+        conn.close()
+
+
+def _psql(database_url: str, sql: str, *, psql: str) -> None:
+    subprocess.run(
+        [psql, database_url, "-q", "-v", "ON_ERROR_STOP=1", "-f", "-"],
+        input=sql,
+        text=True,
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+
+
+def load_schema(database_url: str, *, psql: str = "psql") -> None:
+    """Apply schema.sql and every migration with psql, as the README describes."""
+    # \restrict / \unrestrict only exist in recent psql releases and are not needed here.
+    schema = "\n".join(
+        line for line in (ROOT / "schema.sql").read_text().splitlines() if not line.startswith("\\")
+    )
+    _psql(database_url, schema, psql=psql)
+    for migration in sorted((ROOT / "migrations").glob("*.sql")):
+        _psql(database_url, migration.read_text(), psql=psql)
+
+
+def _uuid(rng: random.Random) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def _copy(cur, table: str, columns: Sequence[str], rows: Iterator[Sequence[object]]) -> int:
+    """COPY ``rows`` into ``table`` in chunks; None becomes NULL."""
+    total = 0
+    buffer = io.StringIO()
+    pending = 0
+
+    def flush() -> None:
+        buffer.seek(0)
+        cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer)
+        buffer.seek(0)
+        buffer.truncate()
+
+    for row in rows:
+        buffer.write("\t".join("\\N" if value is None else str(value) for value in row))
+        buffer.write("\n")
+        pending += 1
+        if pending == COPY_ROWS:
+            flush()
+            total += pending
+            pending = 0
+    if pending:
+        flush()
+        total += pending
+    return total
+
+
+def generate_catalog(cur, rng: random.Random, *, apps: int) -> Tuple[List[str], List[str]]:
+    """Goal categories, subcategories, goals and apps. Returns (goal ids, package names)."""
+    goal_ids: List[str] = []
+    subcategory_ids: List[str] = []
+    for category in range(5):
+        category_id = _uuid(rng)
+        cur.execute(
+            "INSERT INTO public.goal_categories (id, name) VALUES (%s, %s)",
+            (category_id, f"Category {category}"),
+        )
+        for sub in range(4):
+            subcategory_id = _uuid(rng)
+            subcategory_ids.append(subcategory_id)
+            cur.execute(
+                'INSERT INTO public.goal_sub_categories (id, name, "goalCategoryId") VALUES (%s, %s, %s)',
+                (subcategory_id, f"Subcategory {category}.{sub}", category_id),
+            )
+            for goal in range(3):
+                goal_id = _uuid(rng)
+                goal_ids.append(goal_id)
+                cur.execute(
+                    'INSERT INTO public.goals (id, title, "goalCategoryId", "goalSubCategoryId")'
+                    " VALUES (%s, %s, %s, %s)",
+                    (goal_id, f"Goal {category}.{sub}.{goal}", category_id, subcategory_id),
+                )
+
+    packages: List[str] = []
+    for index in range(apps):
+        app_id = _uuid(rng)
+        package = f"com.bench.app{index}"
+        packages.append(package)
+        cur.execute(
+            'INSERT INTO public.apps (id, title, "appId") VALUES (%s, %s, %s)',
+            (app_id, f"App {index}", package),
+        )
+        for subcategory_id in rng.sample(subcategory_ids, rng.randint(1, 3)):
+            cur.execute(
+                'INSERT INTO public.app_goal_sub_categories ("appsId", "goalSubCategoriesId")'
+                " VALUES (%s, %s)",
+                (app_id, subcategory_id),
+            )
+    return goal_ids, packages
+
+
+def _event_rows(
+    rng: random.Random,
+    user_ids: Sequence[str],
+    counts: Sequence[int],
+    packages: Sequence[str],
+    now: datetime,
+) -> Iterator[Tuple[object, ...]]:
+    for user_id, count in zip(user_ids, counts):
+        # A quarter of the users went quiet 2-12 weeks ago; the rest are still active.
+        last_active = now - timedelta(weeks=rng.uniform(2, 12)) if rng.random() < 0.25 else now
+        history = timedelta(weeks=rng.uniform(1, 30))
+        favourites = rng.sample(packages, min(len(packages), rng.randint(1, 8)))
+        sessions = max(1, count // rng.randint(3, 12))
+        for _ in range(count):
+            at = last_active - history * rng.random() ** 2
+            at_naive = at.replace(tzinfo=None)
+            encoding = rng.random()
+            last_used = formatted = date = None
+            if encoding < 0.6:
+                last_used = int(at.timestamp() * 1000)
+            elif encoding < 0.7:
+                last_used = int(at.timestamp())
+            elif encoding < 0.8:
+                formatted = at.strftime("%Y-%m-%d %H:%M:%S")
+            elif encoding < 0.9:
+                date = at.strftime(rng.choice(("%Y-%m-%d", "%d/%m/%Y")))
+            foreground_ms = int(rng.expovariate(1 / 240_000)) if rng.random() < 0.8 else 0
+            minutes = foreground_ms // 60_000 if rng.random() < 0.5 else None
+            yield (
+                user_id,
+                rng.choice(("app_usage", "app_usage", "app_usage", "screen_unlock", "registration")),
+                rng.choice(favourites),
+                f"{user_id[:8]}-{rng.randrange(sessions)}",
+                last_used,
+                formatted,
+                date,
+                None,
+                minutes,
+                foreground_ms,
+                "Pixel 7",
+                "14",
+                at_naive,
+                at_naive if rng.random() < 0.5 else None,
+            )
+
+
+def generate(
+    database_url: str,
+    *,
+    users: int,
+    events: int,
+    apps: int = 200,
+    skew: float = 1.2,
+    seed: int = 7,
+) -> None:
+    rng = random.Random(seed)
+    now = datetime.now(tz=timezone.utc)
+    conn = psycopg2.connect(database_url)
+    try:
+        with conn, conn.cursor() as cur:
+            goal_ids, packages = generate_catalog(cur, rng, apps=apps)
+
+            user_ids = [_uuid(rng) for _ in range(users)]
+            _copy(
+                cur,
+                "public.users",
+                ("id", '"phoneNumber"'),
+                ((user_id, f"+1555{index:07d}") for index, user_id in enumerate(user_ids)),
+            )
+            _copy(
+                cur,
+                "public.user_goals",
+                ('"userId"', '"goalId"', '"relationshipType"'),
+                (
+                    (user_id, goal_id, relationship)
+                    for user_id in user_ids
+                    for goal_id, relationship in zip(
+                        rng.sample(goal_ids, rng.randint(0, 3)), ("primary", "secondary", "tertiary")
+                    )
+                ),
+            )
+
+            weights = [rng.paretovariate(skew) for _ in user_ids]
+            scale = events / sum(weights)
+            counts = [int(weight * scale) for weight in weights]
+            for index in rng.sample(range(users), min(users, events - sum(counts))):
+                counts[index] += 1
+
+            started = time.monotonic()
+            written = _copy(
+                cur, "public.events", EVENT_COLUMNS, _event_rows(rng, user_ids, counts, packages, now)
+            )
+            print(f"loaded {users} users and {written} events in {time.monotonic() - started:.1f}s")
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute("VACUUM ANALYZE")
+    finally:
+        conn.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--database-url", required=True, help="benchmark database (created with --reset)")
+    parser.add_argument("--reset", action="store_true", help="drop and re-create the database first")
+    parser.add_argument("--psql", default="psql", help="psql binary used to apply schema.sql")
+    parser.add_argument("--users", type=int, default=2_000)
+    parser.add_argument("--events", type=int, default=100_000)
+    parser.add_argument("--apps", type=int, default=200)
+    parser.add_argument("--skew", type=float, default=1.2, help="Pareto shape of events per user")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    if args.reset:
+        reset_database(args.database_url)
+        load_schema(args.database_url, psql=args.psql)
+    generate(
+        args.database_url,
+        users=args.users,
+        events=args.events,
+        apps=args.apps,
+        skew=args.skew,
+        seed=args.seed,
+    )
+
+
+if __name__ == "__main__":
+    main()
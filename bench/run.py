@@ -0,0 +1,253 @@
+"""Time the signal functions and HTTP endpoints against a benchmark database.
+
+    python -m bench.run --database-url postgresql://localhost/signals_bench \\
+        --output bench/results/latest.json --baseline bench/baseline.json
+
+Every target runs ``--iterations`` times on users sampled from public.users, after a
+short warm-up, and is reported as p50/p95/p99 latency plus sequential throughput.
+With --baseline, targets whose p95 grew by more than --max-regression fail the run.
+Endpoints are called in-process through FastAPI's TestClient (requires httpx).
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+
+Target = Callable[[str], Any]
+
+# Signal functions are timed on events fetched up front for this many users.
+EVENT_POOL_USERS = 100
+
+
+def percentile(sorted_values: Sequence[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted sequence."""
+    rank = math.ceil(round(fraction * len(sorted_values), 9))
+    return sorted_values[max(0, min(len(sorted_values), rank) - 1)]
+
+
+def measure(target: Target, user_ids: Sequence[str], *, iterations: int, warmup: int) -> Dict[str, float]:
+    rng = random.Random(0)
+    for _ in range(warmup):
+        target(rng.choice(user_ids))
+
+    latencies: List[float] = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        user_id = rng.choice(user_ids)
+        call_started = time.perf_counter()
+        target(user_id)
+        latencies.append((time.perf_counter() - call_started) * 1000.0)
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "iterations": iterations,
+        "p50_ms": round(percentile(latencies, 0.50), 3),
+        "p95_ms": round(percentile(latencies, 0.95), 3),
+        "p99_ms": round(percentile(latencies, 0.99), 3),
+        "mean_ms": round(sum(latencies) / len(latencies), 3),
+        "throughput_per_s": round(iterations / elapsed, 1),
+    }
+
+
+def build_targets(
+    batch_size: int, user_ids: Sequence[str]
+) -> Dict[str, Tuple[Target, Sequence[str]]]:
+    """Map target names to (callable, user ids to draw from)."""
+    from fastapi.testclient import TestClient
+
+    import milestones
+    import signals
+
+    events_by_user = signals.fetch_events_for_users(user_ids[:EVENT_POOL_USERS])
+    event_pool = list(events_by_user)
+
+    def events_for(user_id: str) -> List[Dict[str, Any]]:
+        return events_by_user[user_id]
+
+    def batch(user_id: str) -> List[str]:
+        start = user_ids.index(user_id)
+        return [user_ids[(start + offset) % len(user_ids)] for offset in range(batch_size)]
+
+    client = TestClient(signals.app)
+
+    def get(path: str) -> Target:
+        def call(user_id: str) -> None:
+            response = client.get(path, params={"user_id": user_id})
+            response.raise_for_status()
+
+        return call
+
+    def get_batch(path: str) -> Target:
+        def call(user_id: str) -> None:
+            response = client.get(path, params=[("user_id", uid) for uid in batch(user_id)])
+            response.raise_for_status()
+
+        return call
+
+    def post_bulk(user_id: str) -> None:
+        response = client.post("/signals/bulk", json={"user_ids": batch(user_id)})
+        response.raise_for_status()
+        assert response.text.count("\n") == batch_size
+
+    signal_functions: Dict[str, Target] = {
+        "customer_app_registration_completed": lambda uid: signals.customer_app_registration_completed(
+            events_for(uid)
+        ),
+        "customer_app_login_completed": lambda uid: signals.customer_app_login_completed(events_for(uid)),
+        "customer_app_engaged": lambda uid: signals.customer_app_engaged(events_for(uid)),
+        "customer_app_engagement_dropoff": lambda uid: signals.customer_app_engagement_dropoff(
+            events_for(uid)
+        ),
+        "customer_app_retained": lambda uid: signals.customer_app_retained(events_for(uid)),
+        "customer_app_retained_dropoff": lambda uid: signals.customer_app_retained_dropoff(
+            events_for(uid)
+        ),
+    }
+    functions: Dict[str, Target] = {
+        "fetch_events": signals.fetch_events,
+        "goal_setting_completed": signals.goal_setting_completed,
+        "build_signal_summary": signals.build_signal_summary,
+        "build_milestone_summary": milestones.build_milestone_summary,
+        f"build_signal_summaries[{batch_size}]": lambda uid: signals.build_signal_summaries(batch(uid)),
+        f"build_milestone_summaries[{batch_size}]": lambda uid: milestones.build_milestone_summaries(
+            batch(uid)
+        ),
+    }
+    targets = {name: (target, user_ids) for name, target in functions.items()}
+    targets.update({name: (target, event_pool) for name, target in signal_functions.items()})
+
+    endpoints: Dict[str, Target] = {}
+    for path in (
+        "/signals",
+        "/milestones",
+        "/goal-setting-completed",
+        "/customer-app-registration-completed",
+        "/customer-app-login-completed",
+        "/customer-app-engaged",
+        "/customer-app-engagement-dropoff",
+        "/customer-app-retained",
+        "/customer-app-retained-dropoff",
+    ):
+        endpoints[f"GET {path}"] = get(path)
+    endpoints[f"GET /signals[{batch_size}]"] = get_batch("/signals")
+    endpoints[f"GET /milestones[{batch_size}]"] = get_batch("/milestones")
+    endpoints[f"POST /signals/bulk[{batch_size}]"] = post_bulk
+    targets.update({name: (target, user_ids) for name, target in endpoints.items()})
+    return targets
+
+
+def _dataset() -> Dict[str, Any]:
+    import db
+
+    counts = db.execute_query(
+        """
+        SELECT
+            (SELECT count(*) FROM public.users) AS users,
+            (SELECT count(*) FROM public.events) AS events,
+            (SELECT count(*) FROM public.apps) AS apps,
+            (SELECT count(*) FROM public.user_goals) AS user_goals
+        """,
+        (),
+    )[0]
+    return dict(counts)
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], max_regression: float) -> List[str]:
+    """Targets whose p95 exceeds the baseline p95 by more than ``max_regression``."""
+    regressions = []
+    for name, current in results["targets"].items():
+        previous = baseline.get("targets", {}).get(name)
+        if not previous or not previous.get("p95_ms"):
+            continue
+        ratio = current["p95_ms"] / previous["p95_ms"]
+        if ratio > 1.0 + max_regression:
+            regressions.append(
+                f"{name}: p95 {current['p95_ms']:.2f} ms vs {previous['p95_ms']:.2f} ms baseline"
+                f" (+{(ratio - 1.0) * 100:.0f}%)"
+            )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--database-url", required=True, help="benchmark database built by bench.datagen")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=50, help="users per batched target")
+    parser.add_argument("--sample-users", type=int, default=1_000, help="users drawn from public.users")
+    parser.add_argument("--only", action="append", help="run targets containing this text (repeatable)")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON results to compare against")
+    parser.add_argument(
+        "--max-regression", type=float, default=0.25, help="allowed p95 growth (0.25 = 25%%)"
+    )
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(ROOT))
+    os.environ["DATABASE_URL"] = args.database_url
+    import db
+
+    # db.py lets a local .env override the environment; the benchmark must never run
+    # against anything but the database it was given.
+    db.DATABASE_URL = args.database_url
+    import signals
+
+    user_ids = signals.fetch_user_ids_page(limit=args.sample_users)
+    if not user_ids:
+        parser.error("the benchmark database has no users; run python -m bench.datagen first")
+
+    targets = build_targets(min(args.batch_size, len(user_ids)), user_ids)
+    results: Dict[str, Any] = {
+        "created_at": datetime.now(tz=timezone.utc).isoformat(),
+        "git_revision": _git_revision(),
+        "signal_source": signals.SIGNAL_SOURCE,
+        "dataset": _dataset(),
+        "targets": {},
+    }
+    for name, (target, pool) in targets.items():
+        if args.only and not any(fragment in name for fragment in args.only):
+            continue
+        stats = measure(target, pool, iterations=args.iterations, warmup=args.warmup)
+        results["targets"][name] = stats
+        print(
+            f"{name:<48} p50 {stats['p50_ms']:>9.2f} ms  p95 {stats['p95_ms']:>9.2f} ms"
+            f"  p99 {stats['p99_ms']:>9.2f} ms  {stats['throughput_per_s']:>8.1f}/s"
+        )
+
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(json.dumps(results, indent=2) + "\n")
+
+    if args.baseline:
+        regressions = compare(results, json.loads(Path(args.baseline).read_text()), args.max_regression)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
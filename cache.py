@@ -0,0 +1,141 @@
+"""In-process TTL/LRU cache for per-user signal and milestone summaries."""
+from __future__ import annotations
+
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Hashable, List, Optional, Protocol, Tuple
+
+# Seconds a cached summary may be served for; 0 disables caching.
+SIGNAL_CACHE_TTL_SECONDS = float(os.getenv("SIGNAL_CACHE_TTL_SECONDS", "0"))
+
+# Upper bound on cached entries across all summary kinds (least recently used are evicted).
+SIGNAL_CACHE_MAX_ENTRIES = max(1, int(os.getenv("SIGNAL_CACHE_MAX_ENTRIES", "10000")))
+
+# Anything that changes whenever a cached summary may have changed, e.g. the user's
+# latest event id and timestamp plus the current UTC week.
+Fingerprint = Tuple[Any, ...]
+
+
+class CacheBackend(Protocol):
+    """Storage used by SummaryCache; swap in e.g. a Redis-backed implementation."""
+
+    def get(self, key: Hashable) -> Optional[Any]: ...
+
+    def set(self, key: Hashable, value: Any, ttl: float) -> None: ...
+
+    def clear(self) -> None: ...
+
+    def __len__(self) -> int: ...
+
+
+class MemoryBackend:
+    """Thread-safe LRU mapping whose entries also expire after their TTL."""
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._entries: OrderedDict[Hashable, Tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: float) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+@dataclass
+class CacheCounters:
+    hits: int = 0
+    misses: int = 0
+    # Entries that were present but whose fingerprint no longer matched.
+    invalidations: int = 0
+
+
+class SummaryCache:
+    """Per-user summary cache keyed by ``(kind, user_id)`` and validated by fingerprint."""
+
+    def __init__(self, backend: CacheBackend, *, ttl: float) -> None:
+        self.backend = backend
+        self.ttl = ttl
+        self._counters: Dict[str, CacheCounters] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def lookup(
+        self, kind: str, fingerprints: Dict[str, Fingerprint]
+    ) -> Tuple[Dict[str, Any], List[str]]:
+        """Return cached values whose fingerprint still matches, plus the IDs to recompute."""
+        found: Dict[str, Any] = {}
+        missing: List[str] = []
+        invalidations = 0
+        for user_id, fingerprint in fingerprints.items():
+            entry = self.backend.get((kind, user_id))
+            if entry is not None and entry[0] == fingerprint:
+                found[user_id] = copy.deepcopy(entry[1])
+                continue
+            if entry is not None:
+                invalidations += 1
+            missing.append(user_id)
+        with self._lock:
+            counter = self._counters.setdefault(kind, CacheCounters())
+            counter.hits += len(found)
+            counter.misses += len(missing)
+            counter.invalidations += invalidations
+        return found, missing
+
+    def store(self, kind: str, values: Dict[str, Any], fingerprints: Dict[str, Fingerprint]) -> None:
+        for user_id, value in values.items():
+            self.backend.set((kind, user_id), (fingerprints[user_id], copy.deepcopy(value)), self.ttl)
+
+    def clear(self) -> None:
+        self.backend.clear()
+        with self._lock:
+            self._counters.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = {kind: asdict(counter) for kind, counter in self._counters.items()}
+        return {
+            "enabled": self.enabled,
+            "ttl_seconds": self.ttl,
+            "entries": len(self.backend),
+            "kinds": counters,
+        }
+
+
+summary_cache = SummaryCache(MemoryBackend(SIGNAL_CACHE_MAX_ENTRIES), ttl=SIGNAL_CACHE_TTL_SECONDS)
+
+
+__all__ = [
+    "CacheBackend",
+    "MemoryBackend",
+    "SummaryCache",
+    "summary_cache",
+]
@@ -0,0 +1,117 @@
+"""In-process index from app package names to the goal subcategories of those apps."""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from typing import Any, Dict, FrozenSet, Iterable, Optional, Set, Tuple
+
+from db import execute_query
+
+# Seconds between checks of whether apps / app_goal_sub_categories changed. The catalog
+# is only reloaded when that check reports a different version.
+APP_CATALOG_REFRESH_SECONDS = max(0.0, float(os.getenv("APP_CATALOG_REFRESH_SECONDS", "60")))
+
+# Cheap fingerprint of the catalog: apps are timestamped, the mapping table is not, so
+# it is hashed (it holds a few rows per app).
+_VERSION_QUERY = """
+    SELECT
+        (SELECT count(*) FROM public.apps) AS app_count,
+        (SELECT max("updatedAt") FROM public.apps) AS apps_updated_at,
+        (
+            SELECT md5(COALESCE(string_agg(
+                "appsId"::text || ':' || "goalSubCategoriesId"::text, ','
+                ORDER BY "appsId", "goalSubCategoriesId"
+            ), ''))
+            FROM public.app_goal_sub_categories
+        ) AS mapping_digest
+"""
+
+_LOAD_QUERY = """
+    SELECT a."appId" AS package_name, agsc."goalSubCategoriesId"::text AS goal_subcategory_id
+    FROM public.apps AS a
+    JOIN public.app_goal_sub_categories AS agsc ON agsc."appsId" = a.id
+"""
+
+
+class AppCatalog:
+    """package name -> goal subcategory ids, shared by every request in the process.
+
+    Lookups re-check the catalog version at most once every ``refresh_seconds`` and
+    reload it only when it changed. The mappings are swapped in whole, so readers never
+    see a half-loaded catalog.
+    """
+
+    def __init__(self, refresh_seconds: float = APP_CATALOG_REFRESH_SECONDS) -> None:
+        self.refresh_seconds = refresh_seconds
+        self.reloads = 0
+        self._subcategories: Dict[str, FrozenSet[str]] = {}
+        self._packages: Dict[str, FrozenSet[str]] = {}
+        self._version: Optional[Tuple[Any, ...]] = None
+        self._checked_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _is_stale(self) -> bool:
+        return self._checked_at is None or time.monotonic() - self._checked_at >= self.refresh_seconds
+
+    def refresh(self, *, force: bool = False) -> bool:
+        """Reload the catalog if its version changed (or ``force``); return whether it did."""
+        with self._lock:
+            if not force and not self._is_stale():
+                return False
+            # Read the version before the rows: a change in between only causes one
+            # extra reload on the next check.
+            row = execute_query(_VERSION_QUERY, (), name="app_catalog_version")[0]
+            version = (row["app_count"], row["apps_updated_at"], row["mapping_digest"])
+            if not force and version == self._version:
+                self._checked_at = time.monotonic()
+                return False
+
+            subcategories: Dict[str, Set[str]] = {}
+            packages: Dict[str, Set[str]] = {}
+            for mapping in execute_query(_LOAD_QUERY, (), name="app_catalog_load"):
+                package, subcategory = mapping["package_name"], mapping["goal_subcategory_id"]
+                subcategories.setdefault(package, set()).add(subcategory)
+                packages.setdefault(subcategory, set()).add(package)
+
+            self._subcategories = {key: frozenset(value) for key, value in subcategories.items()}
+            self._packages = {key: frozenset(value) for key, value in packages.items()}
+            self._version = version
+            self._checked_at = time.monotonic()
+            self.reloads += 1
+            return True
+
+    def _current(self) -> None:
+        if self._is_stale():
+            self.refresh()
+
+    def subcategories_for(self, package_names: Iterable[Optional[str]]) -> Set[str]:
+        """Goal subcategory ids of every app among ``package_names``."""
+        self._current()
+        found: Set[str] = set()
+        for package in package_names:
+            found |= self._subcategories.get(package, frozenset())
+        return found
+
+    def packages_for(self, subcategory_ids: Iterable[str]) -> Set[str]:
+        """Package names of the apps mapped to any of ``subcategory_ids``."""
+        self._current()
+        found: Set[str] = set()
+        for subcategory in subcategory_ids:
+            found |= self._packages.get(subcategory, frozenset())
+        return found
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "packages": len(self._subcategories),
+            "reloads": self.reloads,
+            "seconds_since_check": (
+                None if self._checked_at is None else round(time.monotonic() - self._checked_at, 1)
+            ),
+        }
+
+
+app_catalog = AppCatalog()
+
+
+__all__ = ["APP_CATALOG_REFRESH_SECONDS", "AppCatalog", "app_catalog"]
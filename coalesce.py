@@ -0,0 +1,144 @@
+"""Single-flight coalescing of concurrent per-user evaluations within one process."""
+from __future__ import annotations
+
+import asyncio
+import copy
+import functools
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Sequence, Tuple, TypeVar
+
+from metrics import observe_flight, observe_shared
+
+# Set to 0 to compute every request independently, even when another request is
+# already evaluating the same user.
+REQUEST_COALESCING = os.getenv("REQUEST_COALESCING", "1").strip().lower() not in ("0", "false", "no")
+
+T = TypeVar("T")
+
+
+@dataclass(eq=False)
+class _Flight:
+    future: asyncio.Future
+    waiters: int = 0
+
+
+@dataclass
+class FlightCounters:
+    # Users asked for, users computed by the asking request and users taken from a
+    # computation another request had already started.
+    requested: int = 0
+    computed: int = 0
+    shared: int = 0
+    flights: int = 0
+    seconds: float = 0.0
+    max_seconds: float = 0.0
+
+
+class RequestCoalescer:
+    """Share in-flight batched computations per ``(kind, user_id)``.
+
+    A request computes only the users nobody else is computing and waits for the
+    rest. Shared results are deep-copied, so callers may modify what they get.
+    The computation runs as its own task: a caller that is cancelled does not cancel
+    it for the others.
+    """
+
+    def __init__(self, *, enabled: bool = REQUEST_COALESCING) -> None:
+        self.enabled = enabled
+        self._flights: Dict[Tuple[str, str], _Flight] = {}
+        self._counters: Dict[str, FlightCounters] = {}
+
+    async def run(
+        self,
+        kind: str,
+        user_ids: Sequence[str],
+        compute: Callable[[Sequence[str]], Awaitable[Dict[str, T]]],
+    ) -> Dict[str, T]:
+        if not self.enabled:
+            return await compute(user_ids)
+
+        counter = self._counters.setdefault(kind, FlightCounters())
+        own: List[str] = []
+        joined: Dict[str, _Flight] = {}
+        for user_id in dict.fromkeys(user_ids):
+            flight = self._flights.get((kind, user_id))
+            if flight is None:
+                own.append(user_id)
+            else:
+                flight.waiters += 1
+                joined[user_id] = flight
+        counter.requested += len(own) + len(joined)
+        counter.shared += len(joined)
+        observe_shared(kind, len(joined))
+
+        results: Dict[str, T] = {}
+        if own:
+            loop = asyncio.get_running_loop()
+            flights = {user_id: _Flight(loop.create_future()) for user_id in own}
+            for user_id, flight in flights.items():
+                self._flights[(kind, user_id)] = flight
+            task = asyncio.ensure_future(compute(own))
+            task.add_done_callback(
+                functools.partial(self._settle, kind, flights, time.perf_counter())
+            )
+            results.update(await asyncio.shield(task))
+
+        for user_id, flight in joined.items():
+            results[user_id] = copy.deepcopy(await asyncio.shield(flight.future))
+        return {user_id: results[user_id] for user_id in dict.fromkeys(user_ids) if user_id in results}
+
+    def _settle(
+        self, kind: str, flights: Dict[str, _Flight], started: float, task: asyncio.Future
+    ) -> None:
+        # Runs before the computing request resumes, so shared copies are taken before
+        # it can modify the results.
+        elapsed = time.perf_counter() - started
+        counter = self._counters.setdefault(kind, FlightCounters())
+        counter.computed += len(flights)
+        counter.flights += 1
+        counter.seconds += elapsed
+        counter.max_seconds = max(counter.max_seconds, elapsed)
+        observe_flight(kind, elapsed)
+
+        for user_id, flight in flights.items():
+            if self._flights.get((kind, user_id)) is flight:
+                del self._flights[(kind, user_id)]
+            if task.cancelled():
+                flight.future.cancel()
+            elif task.exception() is not None:
+                flight.future.set_exception(task.exception())
+                # Mark it retrieved; the computing request reports the error itself.
+                flight.future.exception()
+            else:
+                computed: Dict[str, Any] = task.result()
+                if user_id not in computed:
+                    flight.future.set_exception(KeyError(user_id))
+                    flight.future.exception()
+                elif flight.waiters:
+                    flight.future.set_result(copy.deepcopy(computed[user_id]))
+                else:
+                    flight.future.set_result(None)
+
+    def stats(self) -> Dict[str, Any]:
+        kinds = {
+            kind: {
+                "requested": counter.requested,
+                "computed": counter.computed,
+                "shared": counter.shared,
+                "flights": counter.flights,
+                "mean_flight_ms": (
+                    round(counter.seconds / counter.flights * 1000.0, 3) if counter.flights else 0.0
+                ),
+                "max_flight_ms": round(counter.max_seconds * 1000.0, 3),
+            }
+            for kind, counter in self._counters.items()
+        }
+        return {"enabled": self.enabled, "in_flight": len(self._flights), "kinds": kinds}
+
+
+request_coalescer = RequestCoalescer()
+
+
+__all__ = ["REQUEST_COALESCING", "RequestCoalescer", "request_coalescer"]
@@ -0,0 +1,303 @@
+"""Vectorised (NumPy/pandas) signal evaluation for large offline cohorts.
+
+``evaluate_cohort_events`` turns a columnar frame of events into one row of flags per
+user using array operations and group-bys instead of per-event Python loops. It is
+meant to agree with the scalar functions in signals.py; ``check_parity`` compares the
+two on any events frame and is exposed on the command line as ``--parity``.
+
+pandas stores timestamps with nanosecond precision, so event times before 1677 or after
+2262 are treated as unparseable here while Python's datetime would accept them.
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, List, Optional, Sequence
+
+try:
+    import numpy as np
+    import pandas as pd
+except ImportError as exc:  # pragma: no cover - optional dependency
+    raise ImportError("cohort.py requires numpy and pandas: pip install numpy pandas") from exc
+
+import db
+from signals import (
+    EVENT_FETCH_BATCH_SIZE,
+    LOOKBACK_WEEKS,
+    build_activity_index,
+    evaluate_signals,
+    fetch_all_user_ids,
+    fetch_goal_settings,
+    read_user_ids_file,
+)
+
+EVENT_COLUMNS = (
+    "user_id",
+    "id",
+    "session_id",
+    "last_time_used",
+    "last_time_used_formatted",
+    "date",
+    "total_time_in_foreground_minutes",
+    "total_time_in_foreground",
+    "total_time_in_foreground_ms",
+    "created_at",
+    "updated_at",
+    "event_ts",
+    "foreground_minutes",
+)
+
+EVENT_FLAG_COLUMNS = (
+    "customer_app_registration_completed",
+    "customer_app_login_completed",
+    "customer_app_engaged",
+    "customer_app_engagement_dropoff",
+    "customer_app_retained",
+    "customer_app_retained_dropoff",
+)
+
+# datetime.fromtimestamp only accepts years 1 through 9999.
+_MIN_EPOCH_SECONDS = -62135596800.0
+_MAX_EPOCH_SECONDS = 253402300800.0
+_SECONDS_PER_DAY = 86400.0
+
+
+def _epoch_seconds(values: pd.Series) -> np.ndarray:
+    stamps = pd.to_datetime(values, errors="coerce", utc=True)
+    seconds = (stamps - pd.Timestamp(0, tz="UTC")) / pd.Timedelta(seconds=1)
+    return seconds.to_numpy(dtype=float, na_value=np.nan)
+
+
+def _parse_text_seconds(values: pd.Series, formats: Iterable[str]) -> np.ndarray:
+    text = values.where(values.map(lambda value: isinstance(value, str) and value != ""))
+    seconds = np.full(len(values), np.nan)
+    for fmt in formats:
+        parsed = pd.to_datetime(text, format=fmt, errors="coerce", utc=True)
+        parsed_seconds = _epoch_seconds(parsed)
+        seconds = np.where(np.isnan(seconds), parsed_seconds, seconds)
+    return seconds
+
+
+def event_seconds(events: pd.DataFrame) -> np.ndarray:
+    """Vectorised ``_event_time``: epoch seconds per event, NaN when nothing parses.
+
+    The stored ``event_ts`` is used where present; each fallback column is only parsed
+    for the rows that are still unresolved.
+    """
+    if "event_ts" not in events:
+        return _parsed_event_seconds(events)
+    seconds = _epoch_seconds(events["event_ts"]).copy()
+    pending = np.isnan(seconds)
+    if pending.any():
+        seconds[pending] = _parsed_event_seconds(events[pending])
+    return seconds
+
+
+def _parsed_event_seconds(events: pd.DataFrame) -> np.ndarray:
+    raw = pd.to_numeric(events["last_time_used"], errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+    raw = np.where(raw > 1e12, raw / 1000.0, raw)
+    seconds = np.where((raw >= _MIN_EPOCH_SECONDS) & (raw < _MAX_EPOCH_SECONDS), raw, np.nan)
+
+    for column, formats in (
+        ("last_time_used_formatted", ("%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%dT%H:%M:%S.%f")),
+        ("date", ("%Y-%m-%d", "%d/%m/%Y")),
+    ):
+        pending = np.isnan(seconds)
+        if pending.any():
+            seconds[pending] = _parse_text_seconds(events[column][pending], formats)
+    for column in ("created_at", "updated_at"):
+        pending = np.isnan(seconds)
+        if pending.any():
+            seconds[pending] = _epoch_seconds(events[column][pending])
+    return seconds
+
+
+def event_minutes(events: pd.DataFrame) -> np.ndarray:
+    """Vectorised ``_minutes_played``: first positive foreground amount, else 0."""
+    def column(name: str) -> np.ndarray:
+        return pd.to_numeric(events[name], errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+
+    minutes = column("total_time_in_foreground_minutes")
+    foreground = column("total_time_in_foreground")
+    foreground_ms = column("total_time_in_foreground_ms") / 60000.0
+    fallback = np.where(foreground > 0, foreground, np.where(foreground_ms > 0, foreground_ms, 0.0))
+    computed = np.where(minutes > 0, minutes, fallback)
+    if "foreground_minutes" not in events:
+        return computed
+    stored = column("foreground_minutes")
+    return np.where(np.isnan(stored), computed, stored)
+
+
+def _session_keys(events: pd.DataFrame) -> pd.Series:
+    """``session_id or id`` as text, or None when both are falsy."""
+    session = events["session_id"]
+    has_session = session.notna() & (session.astype(object) != "")
+    ids = pd.to_numeric(events["id"], errors="coerce")
+    has_id = ids.notna() & (ids != 0)
+    keys = pd.Series(None, index=events.index, dtype=object)
+    keys[has_id] = ids[has_id].astype("int64").astype(str)
+    keys[has_session] = session[has_session].astype(str)
+    return keys
+
+
+def evaluate_cohort_events(
+    events: pd.DataFrame,
+    *,
+    user_ids: Optional[Sequence[str]] = None,
+    now: Optional[datetime] = None,
+) -> pd.DataFrame:
+    """Evaluate every event-based signal for all users in ``events`` at once.
+
+    Returns a frame indexed by user_id with the activity facts (event_count,
+    max_minutes, recent_sessions, activity_mask, where bit ``n`` means active ``n``
+    weeks back) and one boolean column per signal. Users listed in ``user_ids`` without
+    events get an all-false row.
+    """
+    now = now or datetime.now(tz=timezone.utc)
+    now_seconds = now.timestamp()
+    cutoff_seconds = (now - timedelta(days=7)).timestamp()
+
+    user_codes, user_index = pd.factorize(events["user_id"], sort=False)
+    user_count = len(user_index)
+    seconds = event_seconds(events)
+    minutes = event_minutes(events)
+    sessions = _session_keys(events)
+
+    event_count = np.bincount(user_codes, minlength=user_count)
+    max_minutes = np.zeros(user_count)
+    np.maximum.at(max_minutes, user_codes, minutes)
+
+    recent = ~np.isnan(seconds) & (seconds >= cutoff_seconds) & sessions.notna().to_numpy()
+    recent_pairs = pd.DataFrame({"user": user_codes[recent], "session": sessions[recent].to_numpy()})
+    recent_pairs = recent_pairs.drop_duplicates()
+    recent_sessions = np.bincount(recent_pairs["user"].to_numpy(dtype=np.int64), minlength=user_count)
+
+    with np.errstate(invalid="ignore"):
+        weeks_back = np.floor(np.floor((now_seconds - seconds) / _SECONDS_PER_DAY) / 7)
+    active = (minutes > 0) & ~np.isnan(weeks_back) & (weeks_back >= 0) & (weeks_back < LOOKBACK_WEEKS)
+    active_weeks = pd.DataFrame(
+        {"user": user_codes[active], "week": weeks_back[active].astype(np.int64)}
+    ).drop_duplicates()
+    activity_mask = np.zeros(user_count, dtype=np.int64)
+    np.bitwise_or.at(
+        activity_mask,
+        active_weeks["user"].to_numpy(dtype=np.int64),
+        np.left_shift(1, active_weeks["week"].to_numpy(dtype=np.int64)),
+    )
+
+    def weeks(start: int, stop: int) -> int:
+        return sum(1 << week for week in range(start, stop))
+
+    current_week_active = (activity_mask & 1) != 0
+    has_events = event_count > 0
+    frame = pd.DataFrame(
+        {
+            "event_count": event_count,
+            "max_minutes": max_minutes,
+            "recent_sessions": recent_sessions,
+            "activity_mask": activity_mask,
+            "customer_app_registration_completed": has_events
+            & ((max_minutes >= 4.0) | (recent_sessions >= 4)),
+            "customer_app_login_completed": has_events & (max_minutes >= 1.0),
+            "customer_app_engaged": (activity_mask & weeks(0, 3)) == weeks(0, 3),
+            "customer_app_engagement_dropoff": ((activity_mask & 2) != 0) & ~current_week_active,
+            "customer_app_retained": (activity_mask & weeks(0, 9)) == weeks(0, 9),
+            "customer_app_retained_dropoff": ((activity_mask & weeks(1, 10)) == weeks(1, 10))
+            & ~current_week_active,
+        },
+        index=pd.Index(user_index, name="user_id"),
+    )
+
+    if user_ids is not None:
+        frame = frame.reindex(pd.Index(list(dict.fromkeys(user_ids)), name="user_id"))
+        frame[["event_count", "recent_sessions", "activity_mask"]] = (
+            frame[["event_count", "recent_sessions", "activity_mask"]].fillna(0).astype(np.int64)
+        )
+        frame["max_minutes"] = frame["max_minutes"].fillna(0.0)
+        for column in EVENT_FLAG_COLUMNS:
+            frame[column] = frame[column].fillna(False).astype(bool)
+    return frame
+
+
+def load_cohort_events(
+    user_ids: Sequence[str], *, batch_size: int = EVENT_FETCH_BATCH_SIZE
+) -> pd.DataFrame:
+    """Load the columns the signals need for ``user_ids`` into one frame."""
+    query = "SELECT {columns} FROM public.events WHERE user_id = ANY(%s)".format(
+        columns=", ".join(EVENT_COLUMNS)
+    )
+    frames: List[pd.DataFrame] = []
+    with db.connection() as conn:
+        with conn.cursor() as cur:
+            for start in range(0, len(user_ids), batch_size):
+                cur.execute(query, (list(user_ids[start : start + batch_size]),))
+                frames.append(pd.DataFrame.from_records(cur.fetchall(), columns=list(EVENT_COLUMNS)))
+    if not frames:
+        return pd.DataFrame(columns=list(EVENT_COLUMNS))
+    return pd.concat(frames, ignore_index=True)
+
+
+def load_goal_setting_flags(user_ids: Sequence[str]) -> pd.Series:
+    """Set-based ``goal_setting_completed`` for many users (non-UUID ids are False)."""
+    flags = fetch_goal_settings(user_ids)
+    return pd.Series(
+        [flags[uid] for uid in user_ids],
+        index=pd.Index(list(user_ids), name="user_id"),
+        name="goal_setting_completed",
+    )
+
+
+def evaluate_cohort(user_ids: Sequence[str], *, now: Optional[datetime] = None) -> pd.DataFrame:
+    """Load events and goals for ``user_ids`` and return all seven signal flags."""
+    user_ids = list(dict.fromkeys(user_ids))
+    frame = evaluate_cohort_events(load_cohort_events(user_ids), user_ids=user_ids, now=now)
+    frame.insert(0, "goal_setting_completed", load_goal_setting_flags(user_ids))
+    return frame
+
+
+def check_parity(events: pd.DataFrame, *, now: Optional[datetime] = None) -> pd.DataFrame:
+    """Compare vectorised flags with signals.py's scalar evaluation for every user.
+
+    Returns the rows that disagree (empty when both implementations agree).
+    """
+    now = now or datetime.now(tz=timezone.utc)
+    vectorised = evaluate_cohort_events(events, now=now)[list(EVENT_FLAG_COLUMNS)]
+
+    records = events.astype(object).where(events.notna(), None)
+    scalar_rows = {
+        user_id: evaluate_signals(build_activity_index(group.to_dict("records"), now=now))
+        for user_id, group in records.groupby("user_id", sort=False)
+    }
+    scalar = pd.DataFrame.from_dict(scalar_rows, orient="index")[list(EVENT_FLAG_COLUMNS)]
+    scalar = scalar.reindex(vectorised.index)
+    mismatched = (vectorised != scalar).any(axis=1)
+    return vectorised[mismatched].join(scalar[mismatched], rsuffix="_scalar")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Evaluate signals for a cohort of users.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--user-ids-file", help="file with one user id per line")
+    source.add_argument("--all-users", action="store_true", help="evaluate every row of public.users")
+    parser.add_argument("--output", help="CSV file to write (defaults to stdout)")
+    parser.add_argument(
+        "--parity", action="store_true", help="compare against the scalar signal functions instead"
+    )
+    args = parser.parse_args()
+
+    db.configure_pool(1)
+    user_ids = fetch_all_user_ids() if args.all_users else read_user_ids_file(args.user_ids_file)
+    if args.parity:
+        mismatches = check_parity(load_cohort_events(user_ids))
+        if mismatches.empty:
+            print(f"parity ok for {len(user_ids)} users")
+            return
+        mismatches.to_csv(sys.stdout)
+        sys.exit(1)
+
+    evaluate_cohort(user_ids).to_csv(args.output or sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
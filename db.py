@@ -0,0 +1,303 @@
+"""Shared Postgres connection pool and query helpers for the signals service."""
+from __future__ import annotations
+
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import psycopg2
+from dotenv import load_dotenv
+from psycopg2 import pool
+from psycopg2.extensions import QueryCanceledError
+from psycopg2.extras import RealDictCursor
+
+import metrics
+
+# Load environment variables from a local .env file when present. Every module reads its
+# configuration after importing this one, so this is the only place it happens.
+load_dotenv(override=True)
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+if not DATABASE_URL:
+    raise RuntimeError("DATABASE_URL must be configured (see .env.example).")
+
+# Queries run on worker threads. Up to DB_POOL_MAX connections are shared between them;
+# further callers wait up to DB_POOL_TIMEOUT seconds for one to be returned instead of
+# failing straight away. psycopg2 opens DB_POOL_MIN connections up front and closes
+# returned ones once that many are idle, so the default keeps the whole pool warm for the
+# API's fan-out. The one-shot CLIs shrink it to one connection with configure_pool().
+DB_POOL_MAX = max(1, int(os.getenv("DB_POOL_MAX", "10")))
+DB_POOL_MIN = max(0, int(os.getenv("DB_POOL_MIN", str(DB_POOL_MAX))))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+# Server-side limit for every statement on a pooled connection, in milliseconds (0 = none).
+DB_STATEMENT_TIMEOUT_MS = max(0, int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0")))
+
+# Connections left idle for longer than this are pinged before being handed out again.
+DB_HEALTHCHECK_IDLE_SECONDS = float(os.getenv("DB_HEALTHCHECK_IDLE_SECONDS", "30"))
+
+# Rows fetched per round trip when a query is streamed through a server-side cursor.
+DB_STREAM_BATCH_SIZE = max(1, int(os.getenv("DB_STREAM_BATCH_SIZE", "5000")))
+
+_connection_pool: pool.ThreadedConnectionPool | None = None
+_connection_pool_lock = threading.Lock()
+_connection_slots = threading.BoundedSemaphore(DB_POOL_MAX)
+_last_returned: Dict[int, float] = {}
+
+# Set by record_queries(); asyncio.to_thread copies the context, so worker threads record too.
+QueryLog = List[Tuple[str, Tuple[Any, ...]]]
+_query_log: ContextVar[Optional[QueryLog]] = ContextVar("query_log", default=None)
+
+
+def get_connection_pool() -> pool.ThreadedConnectionPool:
+    """Create (and reuse) the process-wide, thread-safe psycopg2 connection pool."""
+    global _connection_pool
+    with _connection_pool_lock:
+        if _connection_pool is None:
+            options: Dict[str, Any] = {}
+            if DB_STATEMENT_TIMEOUT_MS:
+                options["options"] = f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+            _connection_pool = pool.ThreadedConnectionPool(
+                minconn=min(DB_POOL_MIN, DB_POOL_MAX), maxconn=DB_POOL_MAX, dsn=DATABASE_URL, **options
+            )
+    return _connection_pool
+
+
+def configure_pool(size: int) -> None:
+    """Resize this process's pool before its first connection, e.g. to one connection
+    per worker process."""
+    global DB_POOL_MAX, DB_POOL_MIN, _connection_slots
+    with _connection_pool_lock:
+        if _connection_pool is not None:
+            raise RuntimeError("configure_pool() must run before the first connection is opened")
+        DB_POOL_MAX = DB_POOL_MIN = max(1, size)
+        _connection_slots = threading.BoundedSemaphore(DB_POOL_MAX)
+
+
+def _is_healthy(conn: Any) -> bool:
+    if conn.closed:
+        return False
+    returned_at = _last_returned.get(id(conn))
+    if returned_at is not None and time.monotonic() - returned_at < DB_HEALTHCHECK_IDLE_SECONDS:
+        return True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+        conn.rollback()
+    except psycopg2.Error:
+        return False
+    return True
+
+
+def _is_broken(conn: Any, exc: BaseException) -> bool:
+    if conn.closed:
+        return True
+    if isinstance(exc, QueryCanceledError):
+        return False
+    return isinstance(exc, (psycopg2.OperationalError, psycopg2.InterfaceError))
+
+
+def _checkout(conn_pool: pool.ThreadedConnectionPool) -> Any:
+    # Every idle connection may have gone stale (e.g. after a database restart), so allow
+    # one attempt per pooled connection plus a fresh one.
+    for _ in range(DB_POOL_MAX + 1):
+        conn = conn_pool.getconn()
+        if _is_healthy(conn):
+            return conn
+        _last_returned.pop(id(conn), None)
+        conn_pool.putconn(conn, close=True)
+    raise pool.PoolError("could not obtain a healthy database connection")
+
+
+@contextmanager
+def connection() -> Iterator[Any]:
+    """Borrow a pooled connection, waiting for one to free up when all are in use.
+
+    Connections that fail with a connection-level error are closed instead of being
+    returned, so the next caller gets a fresh one.
+    """
+    wait_started = time.perf_counter()
+    if not _connection_slots.acquire(timeout=DB_POOL_TIMEOUT):
+        metrics.observe_pool_wait(time.perf_counter() - wait_started)
+        raise pool.PoolError(f"no database connection became available within {DB_POOL_TIMEOUT}s")
+    try:
+        conn_pool = get_connection_pool()
+        conn = _checkout(conn_pool)
+        metrics.observe_pool_wait(time.perf_counter() - wait_started)
+        broken = False
+        try:
+            yield conn
+        except BaseException as exc:
+            broken = _is_broken(conn, exc)
+            raise
+        finally:
+            if broken or conn.closed:
+                _last_returned.pop(id(conn), None)
+                conn_pool.putconn(conn, close=True)
+            else:
+                _last_returned[id(conn)] = time.monotonic()
+                conn_pool.putconn(conn)
+                # The pool closes connections beyond DB_POOL_MIN; drop their entry while
+                # we still hold the object, so its id cannot be reused by a new connection.
+                if conn.closed:
+                    _last_returned.pop(id(conn), None)
+    finally:
+        _connection_slots.release()
+
+
+@contextmanager
+def record_queries() -> Iterator[QueryLog]:
+    """Collect the (query, params) pairs run through execute_query/execute_scalar."""
+    log: QueryLog = []
+    token = _query_log.set(log)
+    try:
+        yield log
+    finally:
+        _query_log.reset(token)
+
+
+def _prepare(query: str, params: Iterable[Any]) -> Tuple[Any, ...]:
+    params = tuple(params)
+    log = _query_log.get()
+    if log is not None:
+        log.append((query, params))
+    return params
+
+
+def execute_query(query: str, params: Iterable[Any], *, name: str = "query") -> List[Dict[str, Any]]:
+    """Run a SELECT query and return rows as dictionaries.
+
+    ``name`` labels the query's timing and row count in /metrics.
+    """
+    with connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            started = time.perf_counter()
+            cur.execute(query, _prepare(query, params))
+            rows = [dict(row) for row in cur.fetchall()]
+            metrics.observe_query(name, time.perf_counter() - started, len(rows))
+            return rows
+
+
+def execute_rows(query: str, params: Iterable[Any], *, name: str = "query") -> List[Tuple[Any, ...]]:
+    """Run a SELECT query and return rows as plain tuples, in SELECT-list order."""
+    with connection() as conn:
+        with conn.cursor() as cur:
+            started = time.perf_counter()
+            cur.execute(query, _prepare(query, params))
+            rows = cur.fetchall()
+            metrics.observe_query(name, time.perf_counter() - started, len(rows))
+            return rows
+
+
+def iter_batches(
+    query: str,
+    params: Iterable[Any],
+    *,
+    name: str = "query",
+    batch_size: int = DB_STREAM_BATCH_SIZE,
+) -> Iterator[List[Tuple[Any, ...]]]:
+    """Yield the rows of a SELECT as tuples, ``batch_size`` at a time.
+
+    The query runs on a server-side (named) cursor, so only one batch is held in memory
+    however many rows it returns. The pooled connection stays borrowed until the
+    generator is exhausted or closed.
+    """
+    with connection() as conn:
+        with conn.cursor(name="iter_batches") as cur:
+            rows = 0
+            started = time.perf_counter()
+            cur.execute(query, _prepare(query, params))
+            elapsed = time.perf_counter() - started
+            try:
+                while True:
+                    started = time.perf_counter()
+                    batch = cur.fetchmany(batch_size)
+                    elapsed += time.perf_counter() - started
+                    if not batch:
+                        break
+                    rows += len(batch)
+                    yield batch
+            finally:
+                # Only time spent in Postgres counts; the caller's work between batches does not.
+                metrics.observe_query(name, elapsed, rows)
+
+
+def execute_scalar(query: str, params: Iterable[Any], *, name: str = "query") -> Any:
+    """Execute a query that returns a single scalar value."""
+    with connection() as conn:
+        with conn.cursor() as cur:
+            started = time.perf_counter()
+            cur.execute(query, _prepare(query, params))
+            result = cur.fetchone()
+            metrics.observe_query(name, time.perf_counter() - started, 0 if result is None else 1)
+            return result[0] if result else None
+
+
+def is_uuid(value: Any) -> bool:
+    """Whether ``value`` can be cast to ``uuid``; user ids that cannot are skipped by
+    queries against the uuid-keyed tables instead of failing them."""
+    try:
+        uuid.UUID(str(value))
+    except ValueError:
+        return False
+    return True
+
+
+def lock_watermark_key(cur: Any, source: str) -> str:
+    """Serialise workers on ``source`` and return its last processed key ('0' when new).
+
+    The advisory lock is transaction scoped, so advance the watermark in the same
+    transaction as the work it covers.
+    """
+    cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (source,))
+    cur.execute(
+        "SELECT last_processed_key FROM public.high_watermarks WHERE source = %s",
+        (source,),
+    )
+    row = cur.fetchone()
+    if row is None:
+        cur.execute(
+            "INSERT INTO public.high_watermarks (source, last_processed_key) VALUES (%s, '0')",
+            (source,),
+        )
+        return "0"
+    return row[0] or "0"
+
+
+def lock_watermark(cur: Any, source: str) -> int:
+    """:func:`lock_watermark_key` for sources that track an integer id."""
+    return int(lock_watermark_key(cur, source))
+
+
+def advance_watermark(cur: Any, source: str, last_id: Union[int, str]) -> None:
+    cur.execute(
+        """
+        UPDATE public.high_watermarks
+        SET last_processed_key = %s,
+            last_processed_timestamp = (now() AT TIME ZONE 'UTC'),
+            updated_at = CURRENT_TIMESTAMP
+        WHERE source = %s
+        """,
+        (str(last_id), source),
+    )
+
+
+__all__ = [
+    "DATABASE_URL",
+    "advance_watermark",
+    "configure_pool",
+    "connection",
+    "execute_query",
+    "execute_rows",
+    "execute_scalar",
+    "get_connection_pool",
+    "is_uuid",
+    "iter_batches",
+    "lock_watermark",
+    "lock_watermark_key",
+    "record_queries",
+]
@@ -0,0 +1,90 @@
+"""Compact encodings for multi-user signal and milestone responses.
+
+``json`` is the usual per-user object, encoded with orjson when it is installed.
+``bitmask`` packs each user's flags into one integer per group (bit i is the i-th
+flag name in the header). ``columnar`` lists one array of booleans per flag, in
+user_ids order.
+"""
+from __future__ import annotations
+
+import json
+import operator
+from itertools import compress
+from typing import Any, Callable, Dict, Mapping, Optional, Sequence, Tuple
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+FORMATS = ("json", "bitmask", "columnar")
+
+MEDIA_TYPES = {
+    "json": "application/json",
+    "bitmask": "application/vnd.signals.bitmask+json",
+    "columnar": "application/vnd.signals.columnar+json",
+}
+
+# group name ("signals", "milestones") -> (flag names in bit order, flags per user in
+# user_ids order).
+FlagGroups = Dict[str, Tuple[Sequence[str], Sequence[Mapping[str, Any]]]]
+
+
+def dumps(payload: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def negotiate(requested: Optional[str], accept: Optional[str]) -> Optional[str]:
+    """The format asked for by ``?format=`` or else the Accept header.
+
+    None means the default response. Raises ValueError for an unknown ``requested``.
+    """
+    if requested:
+        requested = requested.strip().lower()
+        if requested not in FORMATS:
+            raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+        return requested
+    for media_range in (accept or "").split(","):
+        media_type = media_range.split(";", 1)[0].strip().lower()
+        for name, candidate in MEDIA_TYPES.items():
+            if name != "json" and media_type == candidate:
+                return name
+    return None
+
+
+def _flag_values(names: Sequence[str]) -> Callable[[Mapping[str, Any]], Sequence[Any]]:
+    """Read ``names`` from a flags mapping in one C-level call; missing flags are falsy."""
+    get = operator.itemgetter(*names)
+
+    def values(flags: Mapping[str, Any]) -> Sequence[Any]:
+        try:
+            found = get(flags)
+        except KeyError:
+            return [flags.get(name) for name in names]
+        return found if len(names) > 1 else (found,)
+
+    return values
+
+
+def compact_payload(response_format: str, user_ids: Sequence[str], groups: FlagGroups) -> Dict[str, Any]:
+    """The ``bitmask`` or ``columnar`` body for ``user_ids``."""
+    payload: Dict[str, Any] = {"format": response_format, "user_ids": list(user_ids)}
+    if response_format == "bitmask":
+        payload["flags"] = {group: list(names) for group, (names, _) in groups.items()}
+    for group, (names, per_user) in groups.items():
+        values = _flag_values(names)
+        if response_format == "bitmask":
+            bits = [1 << bit for bit in range(len(names))]
+            payload[group] = [sum(compress(bits, values(flags))) for flags in per_user]
+        else:
+            rows = [values(flags) for flags in per_user]
+            columns = zip(*rows) if rows else ([] for _ in names)
+            payload[group] = {
+                name: [bool(value) for value in column] for name, column in zip(names, columns)
+            }
+    return payload
+
+
+__all__ = ["FORMATS", "MEDIA_TYPES", "compact_payload", "dumps", "negotiate"]
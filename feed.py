@@ -0,0 +1,287 @@
+"""Push feed of signal and milestone transitions, driven by Postgres LISTEN/NOTIFY.
+
+Migration 008 notifies the ``signal_events`` channel with the user id of every new
+event. The feed waits CHANGE_FEED_DEBOUNCE_SECONDS after a user's first notification,
+recomputes that user once, and publishes the flags that differ from the last state it
+saw to every subscriber of GET /signals/changes. Users it has not seen yet are compared
+with their row in user_signal_snapshots (migration 005).
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import math
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, FrozenSet, List, Optional, Sequence, Set
+
+import psycopg2
+
+import db
+from cache import MemoryBackend
+from metrics import observe_feed
+
+# Listen for new events and serve GET /signals/changes (requires migrations 005 and 008).
+CHANGE_FEED_ENABLED = os.getenv("CHANGE_FEED_ENABLED", "0").strip().lower() in ("1", "true", "yes")
+
+# Seconds between a user's first notification and their recompute; further events in
+# that window are folded into the same recompute.
+CHANGE_FEED_DEBOUNCE_SECONDS = max(0.0, float(os.getenv("CHANGE_FEED_DEBOUNCE_SECONDS", "2")))
+
+# Transitions buffered per subscriber. A subscriber that falls this far behind is
+# disconnected instead of slowing down everyone else.
+CHANGE_FEED_QUEUE_SIZE = max(1, int(os.getenv("CHANGE_FEED_QUEUE_SIZE", "1000")))
+
+# Users whose last published state is kept in memory (least recently changed are
+# evicted and compared against their snapshot again).
+CHANGE_FEED_MAX_USERS = max(1, int(os.getenv("CHANGE_FEED_MAX_USERS", "100000")))
+
+CHANNEL = "signal_events"
+
+# Seconds between a comment line on idle streams, so proxies keep them open.
+KEEPALIVE_SECONDS = 15.0
+
+RECONNECT_SECONDS = 5.0
+
+logger = logging.getLogger("feed")
+
+# user ids -> {"signals": {...}, "milestones": {...}} per user, as served by /milestones.
+Compute = Callable[[Sequence[str]], Awaitable[Dict[str, Dict[str, Any]]]]
+# user ids -> the stored user_signal_snapshots rows of those that have one.
+LoadSnapshots = Callable[[Sequence[str]], Dict[str, Dict[str, Any]]]
+
+State = Dict[str, Dict[str, bool]]
+
+
+@dataclass(eq=False)
+class _Subscriber:
+    user_ids: Optional[FrozenSet[str]]
+    queue: "asyncio.Queue[Optional[str]]" = field(
+        default_factory=lambda: asyncio.Queue(maxsize=CHANGE_FEED_QUEUE_SIZE)
+    )
+
+
+def missing_migrations() -> List[str]:
+    """The migrations the feed depends on that are not applied to the database."""
+    query = """
+        SELECT
+            to_regclass('public.user_signal_snapshots') IS NOT NULL AS snapshots,
+            EXISTS (
+                SELECT 1 FROM pg_trigger
+                WHERE tgrelid = 'public.events'::regclass
+                  AND tgname = 'events_notify_signal_change'
+            ) AS notify
+    """
+    (row,) = db.execute_query(query, (), name="change_feed_migrations")
+    missing = []
+    if not row["snapshots"]:
+        missing.append("005_user_signal_snapshots.sql")
+    if not row["notify"]:
+        missing.append("008_event_change_notify.sql")
+    return missing
+
+
+def _flags(values: Dict[str, Any]) -> Dict[str, bool]:
+    return {name: value for name, value in values.items() if isinstance(value, bool)}
+
+
+def _changes(previous: Optional[Dict[str, bool]], current: Dict[str, bool]) -> Dict[str, bool]:
+    # Without a previous state every flag counts as having been false.
+    previous = previous or {}
+    return {name: value for name, value in current.items() if previous.get(name, False) != value}
+
+
+class ChangeFeed:
+    """One LISTEN connection per process, fanning transitions out to SSE subscribers."""
+
+    def __init__(
+        self,
+        *,
+        debounce: float = CHANGE_FEED_DEBOUNCE_SECONDS,
+        max_users: int = CHANGE_FEED_MAX_USERS,
+    ) -> None:
+        self.debounce = debounce
+        self._states = MemoryBackend(max_users)
+        self._pending: Dict[str, float] = {}
+        self._subscribers: Set[_Subscriber] = set()
+        self._sequence = 0
+        self._task: Optional[asyncio.Task] = None
+        self._compute: Optional[Compute] = None
+        self._load_snapshots: Optional[LoadSnapshots] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, compute: Compute, load_snapshots: LoadSnapshots) -> None:
+        self._compute = compute
+        self._load_snapshots = load_snapshots
+        self._task = asyncio.create_task(self._supervise())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _supervise(self) -> None:
+        while True:
+            try:
+                await self._listen()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Events inserted while disconnected are not announced; subscribers
+                # that must not miss any re-read /milestones after a gap.
+                logger.warning("change feed listener failed; reconnecting", exc_info=True)
+            await asyncio.sleep(RECONNECT_SECONDS)
+
+    async def _listen(self) -> None:
+        # A dedicated connection: LISTEN is tied to the session, so it cannot be pooled.
+        # TCP keepalives make a dead server show up as a read error on an idle feed.
+        conn = await asyncio.to_thread(
+            psycopg2.connect,
+            db.DATABASE_URL,
+            keepalives=1,
+            keepalives_idle=30,
+            keepalives_interval=10,
+            keepalives_count=3,
+        )
+        loop = asyncio.get_running_loop()
+        readable = asyncio.Event()
+        fileno = conn.fileno()
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute(f"LISTEN {CHANNEL}")
+            loop.add_reader(fileno, readable.set)
+            logger.info("change feed listening on %s", CHANNEL)
+            while True:
+                timeout = None
+                if self._pending:
+                    timeout = max(0.0, min(self._pending.values()) - time.monotonic())
+                try:
+                    await asyncio.wait_for(readable.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                readable.clear()
+                conn.poll()
+                self._collect(conn.notifies)
+                conn.notifies.clear()
+                now = time.monotonic()
+                due = [user_id for user_id, due_at in self._pending.items() if due_at <= now]
+                if due:
+                    for user_id in due:
+                        del self._pending[user_id]
+                    await self._recompute(due)
+        finally:
+            loop.remove_reader(fileno)
+            conn.close()
+
+    def _collect(self, notifies: Sequence[Any]) -> None:
+        due_at = time.monotonic() + self.debounce
+        for notify in notifies:
+            self._pending.setdefault(notify.payload, due_at)
+        observe_feed("notification", len(notifies))
+
+    async def _previous_states(self, user_ids: Sequence[str]) -> Dict[str, Optional[State]]:
+        """Last published state per user, falling back to the stored snapshot."""
+        states: Dict[str, Optional[State]] = {uid: self._states.get(uid) for uid in user_ids}
+        unknown = [uid for uid, state in states.items() if state is None]
+        if unknown and self._load_snapshots is not None:
+            snapshots = await asyncio.to_thread(self._load_snapshots, unknown)
+            for uid, snapshot in snapshots.items():
+                states[uid] = {"signals": snapshot["signals"], "milestones": snapshot["milestones"]}
+        return states
+
+    async def _recompute(self, user_ids: Sequence[str]) -> None:
+        assert self._compute is not None
+        try:
+            previous = await self._previous_states(user_ids)
+            payloads = await self._compute(user_ids)
+        except Exception:
+            logger.exception("change feed could not recompute %s users", len(user_ids))
+            return
+        observe_feed("recompute", len(payloads))
+        computed_at = datetime.now(tz=timezone.utc).isoformat()
+        for user_id, payload in payloads.items():
+            current: State = {
+                "signals": _flags(payload["signals"]),
+                "milestones": _flags(payload["milestones"]),
+            }
+            before = previous.get(user_id) or {}
+            signals = _changes(before.get("signals"), current["signals"])
+            milestones = _changes(before.get("milestones"), current["milestones"])
+            self._states.set(user_id, current, math.inf)
+            if signals or milestones:
+                self._publish(
+                    {
+                        "user_id": user_id,
+                        "signals": signals,
+                        "milestones": milestones,
+                        "computed_at": computed_at,
+                    }
+                )
+
+    def _publish(self, transition: Dict[str, Any]) -> None:
+        self._sequence += 1
+        message = f"id: {self._sequence}\nevent: transition\ndata: {json.dumps(transition)}\n\n"
+        observe_feed("transition")
+        for subscriber in list(self._subscribers):
+            if subscriber.user_ids is not None and transition["user_id"] not in subscriber.user_ids:
+                continue
+            try:
+                subscriber.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # Replace the backlog with the end-of-stream marker.
+                while not subscriber.queue.empty():
+                    subscriber.queue.get_nowait()
+                subscriber.queue.put_nowait(None)
+                self._subscribers.discard(subscriber)
+                observe_feed("dropped_subscriber")
+
+    async def stream(self, user_ids: Optional[Sequence[str]] = None) -> AsyncIterator[str]:
+        """Server-sent events for the transitions of ``user_ids`` (every user when None)."""
+        subscriber = _Subscriber(frozenset(user_ids) if user_ids else None)
+        self._subscribers.add(subscriber)
+        try:
+            yield ": connected\n\n"
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscriber.queue.get(), KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if message is None:
+                    yield 'event: overflow\ndata: {"reason": "subscriber fell behind"}\n\n'
+                    return
+                yield message
+        finally:
+            self._subscribers.discard(subscriber)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.running,
+            "subscribers": len(self._subscribers),
+            "pending_users": len(self._pending),
+            "tracked_users": len(self._states),
+            "published": self._sequence,
+        }
+
+
+change_feed = ChangeFeed()
+
+
+__all__ = [
+    "CHANGE_FEED_ENABLED",
+    "ChangeFeed",
+    "change_feed",
+    "missing_migrations",
+]
@@ -0,0 +1,160 @@
+"""Run EXPLAIN (ANALYZE, BUFFERS) on the service's queries and flag seq scans and sorts.
+
+Each workload below calls the same functions the endpoints and batch jobs use, for a
+sample of users, while db.record_queries() captures the SQL they issue. Every captured
+statement is then re-run under EXPLAIN inside a transaction that is rolled back.
+
+Only reads are covered. The writes are left out: snapshot and milestone-log upserts,
+rollup.py's fold, ingest.py's COPY and merge, backfill.py's updates, high_watermarks
+locking and updates, and the change feed's LISTEN.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterator, List, Sequence, Tuple
+
+import db
+import milestones
+import signals
+import snapshots
+import sweep
+from catalog import AppCatalog
+
+Workload = Callable[[Sequence[str]], Any]
+
+WORKLOADS: Dict[str, Workload] = {
+    "fetch_events_for_users": signals.fetch_events_for_users,
+    "fetch_events_for_users(window)": lambda user_ids: signals.fetch_events_for_users(
+        user_ids, since=datetime.now(tz=timezone.utc) - timedelta(weeks=signals.LOOKBACK_WEEKS)
+    ),
+    "stream_activity_indexes": lambda user_ids: signals.stream_activity_indexes(
+        user_ids, since=datetime.now(tz=timezone.utc) - timedelta(weeks=signals.LOOKBACK_WEEKS)
+    ),
+    "fetch_event_fingerprints": signals.fetch_event_fingerprints,
+    "fetch_activity_summaries": signals.fetch_activity_summaries,
+    "fetch_lifetime_activity": signals.fetch_lifetime_activity,
+    "fetch_rollup_summaries": signals.fetch_rollup_summaries,
+    "fetch_snapshots": signals.fetch_snapshots,
+    "fetch_user_ids_page": lambda user_ids: signals.fetch_user_ids_page(limit=len(user_ids)),
+    "fetch_goal_settings": signals.fetch_goal_settings,
+    # A new catalog, so the version and load queries run whatever the shared one holds.
+    "app_catalog": lambda user_ids: AppCatalog().refresh(force=True),
+    "fetch_tier_activity": milestones.fetch_tier_activity,
+    # The per-user milestone lookups issue the same statement for every user.
+    "fetch_goal_subcategories_by_tier": lambda user_ids: milestones.fetch_goal_subcategories_by_tier(
+        user_ids[0]
+    ),
+    "fetch_event_goal_subcategories": lambda user_ids: milestones.fetch_event_goal_subcategories(
+        user_ids[0]
+    ),
+    "fetch_active_user_ids": lambda user_ids: snapshots.fetch_active_user_ids(),
+    "shard_user_ids(hash)": lambda user_ids: sweep.shard_user_ids("hash", 64, 0),
+    "shard_user_ids(range)": lambda user_ids: sweep.shard_user_ids("range", 64, 1),
+}
+
+
+def capture_queries(user_ids: Sequence[str]) -> List[Tuple[str, str, Tuple[Any, ...]]]:
+    """Return (workload, query, params) for each distinct statement the workloads issue."""
+    captured: List[Tuple[str, str, Tuple[Any, ...]]] = []
+    seen = set()
+    for name, workload in WORKLOADS.items():
+        with db.record_queries() as log:
+            workload(user_ids)
+        for query, params in log:
+            if query not in seen:
+                seen.add(query)
+                captured.append((name, query, params))
+    return captured
+
+
+def explain(query: str, params: Tuple[Any, ...]) -> Dict[str, Any]:
+    with db.connection() as conn:
+        try:
+            with conn.cursor() as cur:
+                cur.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + query, params)
+                return cur.fetchone()[0][0]
+        finally:
+            conn.rollback()
+
+
+def _walk(node: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    yield node
+    for child in node.get("Plans", ()):
+        yield from _walk(child)
+
+
+def find_issues(plan: Dict[str, Any], *, min_rows: int = 0) -> List[str]:
+    """Describe the Seq Scan and Sort nodes of an EXPLAIN (FORMAT JSON) plan."""
+    issues: List[str] = []
+    for node in _walk(plan["Plan"]):
+        loops = node.get("Actual Loops", 1)
+        if node["Node Type"] == "Seq Scan":
+            rows = (node.get("Actual Rows", 0) + node.get("Rows Removed by Filter", 0)) * loops
+            if rows >= min_rows:
+                relation = node["Relation Name"]
+                issues.append(f"Seq Scan on {relation} read {rows} rows over {loops} loop(s)")
+        elif node["Node Type"] == "Sort":
+            rows = node.get("Actual Rows", 0) * loops
+            if rows >= min_rows:
+                keys = ", ".join(node.get("Sort Key", []))
+                issues.append(
+                    f"Sort on ({keys}) of {rows} rows using {node.get('Sort Method', '?')}"
+                    f" ({node.get('Sort Space Used', '?')} kB {node.get('Sort Space Type', '')})".rstrip()
+                )
+    return issues
+
+
+def _summarise(query: str, width: int = 100) -> str:
+    text = " ".join(query.split())
+    return text if len(text) <= width else text[: width - 3] + "..."
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--user-ids-file", help="file with one user id per line (defaults to a sample)")
+    parser.add_argument("--sample", type=int, default=100, help="users taken from public.users otherwise")
+    parser.add_argument("--min-rows", type=int, default=1000, help="ignore smaller scans and sorts")
+    parser.add_argument("--json", action="store_true", help="print the findings as JSON")
+    parser.add_argument("--fail-on-findings", action="store_true", help="exit 1 if anything is flagged")
+    args = parser.parse_args()
+
+    db.configure_pool(1)
+    if args.user_ids_file:
+        user_ids = signals.read_user_ids_file(args.user_ids_file)
+    else:
+        user_ids = signals.fetch_user_ids_page(limit=args.sample)
+    if not user_ids:
+        parser.error("no users to sample")
+
+    report = []
+    for name, query, params in capture_queries(user_ids):
+        plan = explain(query, params)
+        report.append(
+            {
+                "workload": name,
+                "query": _summarise(query),
+                "execution_ms": plan.get("Execution Time"),
+                "issues": find_issues(plan, min_rows=args.min_rows),
+            }
+        )
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for entry in report:
+            status = "FLAGGED" if entry["issues"] else "ok"
+            print(f"[{status}] {entry['workload']} ({entry['execution_ms']:.1f} ms): {entry['query']}")
+            for issue in entry["issues"]:
+                print(f"    - {issue}")
+
+    if args.fail_on_findings and any(entry["issues"] for entry in report):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,400 @@
+"""Bulk-load Firebase usage exports (JSON / NDJSON files) into public.events.
+
+    python ingest.py exports/                       # every *.json / *.ndjson / *.jsonl(.gz) file
+    python ingest.py exports/2024-05-01.ndjson --batch-size 200000
+
+Records are read in batches, COPY'd into a temporary staging table and merged into
+events with one INSERT ... SELECT per batch, which also fills event_ts and
+foreground_minutes with the migration 001 functions. Records that repeat the
+(user_id, session_id, last_time_used) of an existing event, or of an earlier record,
+are skipped. Progress (file name and record offset) is stored in public.high_watermarks
+in the same transaction as each batch, so an interrupted run resumes where it stopped.
+Files are processed in name order; name exports so that later ones sort later. JSON array
+files are streamed with the optional ijson package; NDJSON needs no extra dependency.
+"""
+from __future__ import annotations
+
+import argparse
+import gzip
+import io
+import json
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import IO, Any, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import db
+
+WATERMARK_SOURCE = "firebase_ingest"
+
+EXPORT_SUFFIXES = (".json", ".ndjson", ".jsonl")
+
+logger = logging.getLogger("ingest")
+
+# events column -> (accepted record keys, type, max length). Firebase exports use
+# camelCase; snake_case is accepted too.
+COLUMNS: Dict[str, Tuple[Tuple[str, ...], type, Optional[int]]] = {
+    "user_id": (("user_id", "userId", "uid"), str, 255),
+    "event_type": (("event_type", "eventType", "eventName"), str, 100),
+    "package_name": (("package_name", "packageName"), str, 255),
+    "session_id": (("session_id", "sessionId"), str, 255),
+    "last_time_used": (("last_time_used", "lastTimeUsed"), int, None),
+    "last_time_used_formatted": (("last_time_used_formatted", "lastTimeUsedFormatted"), str, 50),
+    "date": (("date",), str, 50),
+    "total_time_in_foreground": (("total_time_in_foreground", "totalTimeInForeground"), int, None),
+    "total_time_in_foreground_minutes": (
+        ("total_time_in_foreground_minutes", "totalTimeInForegroundMinutes"),
+        int,
+        None,
+    ),
+    "total_time_in_foreground_ms": (
+        ("total_time_in_foreground_ms", "totalTimeInForegroundMs"),
+        int,
+        None,
+    ),
+    "device_model": (("device_model", "deviceModel"), str, 255),
+    "android_version": (("android_version", "androidVersion"), str, 50),
+    "phone_number": (("phone_number", "phoneNumber"), str, 50),
+    "username": (("username", "userName"), str, 255),
+    "rank": (("rank",), int, None),
+    "is_scheduled": (("is_scheduled", "isScheduled"), bool, None),
+}
+
+_STAGING_TABLE = "firebase_events_staging"
+
+# Rows are deleted at every commit, so one staging table serves all batches on a connection.
+_CREATE_STAGING = f"""
+    CREATE TEMP TABLE IF NOT EXISTS {_STAGING_TABLE} ON COMMIT DELETE ROWS AS
+    SELECT 0::bigint AS ordinal, {", ".join(COLUMNS)}
+    FROM public.events
+    WITH NO DATA
+"""
+
+# One row per dedupe key (the first record wins), minus keys already in events. The
+# NULL-safe key matches idx_events_dedupe_key from migration 007.
+_MERGE = f"""
+    INSERT INTO public.events ({", ".join(COLUMNS)}, event_ts, foreground_minutes)
+    SELECT {", ".join(COLUMNS)},
+        public.signal_event_ts(last_time_used, last_time_used_formatted, date, NULL, NULL),
+        public.signal_event_minutes(
+            total_time_in_foreground_minutes, total_time_in_foreground, total_time_in_foreground_ms
+        )
+    FROM (
+        SELECT DISTINCT ON (user_id, COALESCE(session_id, ''), COALESCE(last_time_used, -1)) *
+        FROM {_STAGING_TABLE}
+        ORDER BY user_id, COALESCE(session_id, ''), COALESCE(last_time_used, -1), ordinal
+    ) AS s
+    WHERE NOT EXISTS (
+        SELECT 1
+        FROM public.events AS e
+        WHERE e.user_id = s.user_id
+          AND COALESCE(e.session_id, '') = COALESCE(s.session_id, '')
+          AND COALESCE(e.last_time_used, -1) = COALESCE(s.last_time_used, -1)
+    )
+"""
+
+
+class InvalidRecord(ValueError):
+    pass
+
+
+@dataclass
+class IngestStats:
+    records: int = 0
+    inserted: int = 0
+    duplicates: int = 0
+    invalid: int = 0
+    seconds: float = 0.0
+
+    def add(self, other: "IngestStats") -> None:
+        self.records += other.records
+        self.inserted += other.inserted
+        self.duplicates += other.duplicates
+        self.invalid += other.invalid
+        self.seconds += other.seconds
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.records / self.seconds if self.seconds else 0.0
+
+
+def _coerce(value: Any, kind: type, max_length: Optional[int]) -> Any:
+    if value is None or value == "":
+        return None
+    if kind is int:
+        if isinstance(value, bool):
+            raise InvalidRecord(f"expected a number, got {value!r}")
+        if isinstance(value, int):
+            return value
+        try:
+            # The integer columns drop any fraction, as an INSERT into them would.
+            return int(float(value))
+        except (TypeError, ValueError, OverflowError):
+            raise InvalidRecord(f"expected a number, got {value!r}") from None
+    if kind is bool:
+        if isinstance(value, bool):
+            return value
+        if str(value).lower() in ("true", "1"):
+            return True
+        if str(value).lower() in ("false", "0"):
+            return False
+        raise InvalidRecord(f"expected a boolean, got {value!r}")
+    text = value if isinstance(value, str) else str(value)
+    if max_length is not None and len(text) > max_length:
+        raise InvalidRecord(f"{text[:20]!r}... is longer than {max_length} characters")
+    return text
+
+
+def normalize_record(record: Dict[str, Any]) -> Tuple[Any, ...]:
+    """Map one export record onto the staged events columns (in COLUMNS order)."""
+    if not isinstance(record, dict):
+        raise InvalidRecord("record is not a JSON object")
+    values = []
+    for keys, kind, max_length in COLUMNS.values():
+        value = None
+        for key in keys:
+            if key in record:
+                value = record[key]
+                break
+        values.append(_coerce(value, kind, max_length))
+    if values[0] is None:
+        raise InvalidRecord("record has no user id")
+    return tuple(values)
+
+
+def _copy_text(value: Any) -> str:
+    if value is None:
+        return "\\N"
+    if value is True:
+        return "t"
+    if value is False:
+        return "f"
+    if isinstance(value, str):
+        return (
+            value.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+        )
+    return str(value)
+
+
+def _open(path: Path) -> IO[bytes]:
+    if path.suffix == ".gz":
+        return gzip.open(path, "rb")
+    return path.open("rb")
+
+
+def _array_items(handle: IO[bytes]) -> Iterator[Any]:
+    # Parsed incrementally, so a JSON array export never has to fit in memory.
+    try:
+        import ijson
+    except ImportError as exc:  # pragma: no cover - optional dependency
+        raise ImportError(
+            "JSON array exports need ijson (pip install ijson); NDJSON files load without it"
+        ) from exc
+    return ijson.items(handle, "item", use_float=True)
+
+
+def read_records(path: Path) -> Iterator[Any]:
+    """Yield the records of a JSON array file or an NDJSON file (optionally gzipped)."""
+    with _open(path) as handle:
+        first = handle.read(1)
+        while first.isspace():
+            first = handle.read(1)
+        if first == b"[":
+            handle.seek(0)
+            yield from _array_items(handle)
+            return
+        handle.seek(0)
+        for line in handle:
+            if line.strip():
+                yield json.loads(line)
+
+
+def export_files(paths: Sequence[str]) -> List[Path]:
+    """Expand directories and sort by file name, the order the watermark relies on."""
+    files: List[Path] = []
+    for raw in paths:
+        path = Path(raw)
+        if path.is_dir():
+            files.extend(
+                child
+                for child in path.iterdir()
+                if child.is_file() and child.name.removesuffix(".gz").endswith(EXPORT_SUFFIXES)
+            )
+        else:
+            files.append(path)
+    return sorted(files, key=lambda file: file.name)
+
+
+def _read_position(cur: Any, source: str) -> Tuple[str, int]:
+    key = db.lock_watermark_key(cur, source)
+    if not key or key == "0":
+        return "", 0
+    position = json.loads(key)
+    return position["file"], position["offset"]
+
+
+def load_batch(
+    conn: Any, rows: List[Tuple[Any, ...]], *, source: str, file_name: str, offset: int
+) -> Tuple[int, bool]:
+    """COPY ``rows`` to staging, merge them into events and move the watermark to
+    ``offset`` in ``file_name``, in one transaction.
+
+    Returns (rows inserted, whether the batch was applied). A batch is skipped when
+    another run already moved the watermark past it.
+    """
+    with conn:
+        with conn.cursor() as cur:
+            # A crash can only lose whole batches together with their watermark, which
+            # are then simply loaded again.
+            cur.execute("SET LOCAL synchronous_commit = off")
+            # Room for the merge's dedupe sort, which otherwise spills to disk.
+            cur.execute("SET LOCAL work_mem = '64MB'")
+            if (file_name, offset) <= _read_position(cur, source):
+                return 0, False
+            cur.execute(_CREATE_STAGING)
+            buffer = io.StringIO()
+            for ordinal, row in enumerate(rows):
+                buffer.write(f"{ordinal}\t")
+                buffer.write("\t".join(_copy_text(value) for value in row))
+                buffer.write("\n")
+            buffer.seek(0)
+            cur.copy_expert(f"COPY {_STAGING_TABLE} (ordinal, {', '.join(COLUMNS)}) FROM STDIN", buffer)
+            cur.execute(_MERGE)
+            inserted = cur.rowcount
+            db.advance_watermark(cur, source, json.dumps({"file": file_name, "offset": offset}))
+    return inserted, True
+
+
+class Batch(NamedTuple):
+    rows: List[Tuple[Any, ...]]
+    offset: int  # records of the file read so far, including this batch
+    records: int
+    invalid: int
+
+
+def read_batches(path: Path, *, batch_size: int, skip: int = 0) -> Iterator[Batch]:
+    """Normalised records of ``path`` from record ``skip`` onwards, ``batch_size`` at a time."""
+    rows: List[Tuple[Any, ...]] = []
+    offset = records = invalid = 0
+    for record in read_records(path):
+        offset += 1
+        if offset <= skip:
+            continue
+        records += 1
+        try:
+            rows.append(normalize_record(record))
+        except InvalidRecord as exc:
+            invalid += 1
+            logger.debug("%s record %s skipped: %s", path.name, offset, exc)
+        if records == batch_size:
+            yield Batch(rows, offset, records, invalid)
+            rows, records, invalid = [], 0, 0
+    if records:
+        yield Batch(rows, offset, records, invalid)
+
+
+def _prefetch(batches: Iterator[Batch]) -> Iterator[Batch]:
+    """Read the next batch on a thread while the current one is loaded.
+
+    psycopg2 releases the GIL while the server merges, so parsing overlaps with it.
+    """
+    ready: "queue.Queue[Any]" = queue.Queue(maxsize=1)
+    done = object()
+
+    def produce() -> None:
+        try:
+            for batch in batches:
+                ready.put(batch)
+        except BaseException as exc:  # re-raised on the consuming side
+            ready.put(exc)
+        else:
+            ready.put(done)
+
+    threading.Thread(target=produce, name="ingest-reader", daemon=True).start()
+    while True:
+        item = ready.get()
+        if item is done:
+            return
+        if isinstance(item, BaseException):
+            raise item
+        yield item
+
+
+def ingest_file(
+    conn: Any, path: Path, *, batch_size: int, source: str, skip: int = 0
+) -> IngestStats:
+    """Load ``path`` from record ``skip`` onwards in batches of ``batch_size`` records."""
+    stats = IngestStats()
+    started = time.perf_counter()
+    for batch in _prefetch(read_batches(path, batch_size=batch_size, skip=skip)):
+        inserted, applied = load_batch(
+            conn, batch.rows, source=source, file_name=path.name, offset=batch.offset
+        )
+        now = time.perf_counter()
+        loaded = IngestStats(
+            records=batch.records,
+            inserted=inserted,
+            duplicates=len(batch.rows) - inserted if applied else 0,
+            invalid=batch.invalid,
+            seconds=now - started,
+        )
+        started = now
+        stats.add(loaded)
+        logger.info(
+            "%s: %s records up to %s, %s inserted, %s duplicates, %s invalid (%.0f records/s)",
+            path.name,
+            loaded.records,
+            batch.offset,
+            loaded.inserted,
+            loaded.duplicates,
+            loaded.invalid,
+            loaded.rows_per_second,
+        )
+    return stats
+
+
+def run(paths: Sequence[str], *, batch_size: int, source: str = WATERMARK_SOURCE) -> IngestStats:
+    total = IngestStats()
+    with db.connection() as conn:
+        with conn:
+            with conn.cursor() as cur:
+                done_file, done_offset = _read_position(cur, source)
+        for path in export_files(paths):
+            if path.name < done_file:
+                logger.info("%s: already loaded, skipping", path.name)
+                continue
+            skip = done_offset if path.name == done_file else 0
+            total.add(ingest_file(conn, path, batch_size=batch_size, source=source, skip=skip))
+    logger.info(
+        "loaded %s records: %s inserted, %s duplicates, %s invalid in %.1fs (%.0f records/s)",
+        total.records,
+        total.inserted,
+        total.duplicates,
+        total.invalid,
+        total.seconds,
+        total.rows_per_second,
+    )
+    return total
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("paths", nargs="+", help="export files or directories")
+    parser.add_argument("--batch-size", type=int, default=100_000, help="records per transaction")
+    parser.add_argument(
+        "--source", default=WATERMARK_SOURCE, help="high_watermarks source that tracks progress"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    db.configure_pool(1)
+    run(args.paths, batch_size=args.batch_size, source=args.source)
+
+
+if __name__ == "__main__":
+    main()
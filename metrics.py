@@ -0,0 +1,263 @@
+"""In-process request, query and evaluation metrics in the Prometheus text format."""
+from __future__ import annotations
+
+import bisect
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Set to 0 to turn every timer into a no-op (/metrics then only reports zeroes).
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1").strip().lower() not in ("0", "false", "no")
+
+# Add a Server-Timing header (query, pool wait and evaluation totals) to every response.
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING", "0").strip().lower() in ("1", "true", "yes")
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROW_BUCKETS = (0, 1, 10, 100, 1_000, 10_000, 100_000, 1_000_000)
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, value in values:
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f"{self.name}{labels} {_format_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: (non-cumulative bucket counts incl. +Inf, sum).
+        self._series: Dict[Labels, Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, *label_values: str, value: float) -> None:
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][position] += 1
+            series[1][0] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted(
+                (labels, (list(counts), total[0])) for labels, (counts, total) in self._series.items()
+            )
+        for label_values, (counts, total) in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = f'le="{_format_number(bound)}"'
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(self.labels, label_values, le)} {cumulative}"
+                )
+            label_text = _format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{label_text} {_format_number(total)}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+HTTP_REQUESTS = Counter(
+    "signals_http_requests_total", "HTTP requests by route and status.", ("method", "route", "status")
+)
+HTTP_DURATION = Histogram(
+    "signals_http_request_duration_seconds", "Time to produce the response headers.", ("method", "route")
+)
+QUERY_DURATION = Histogram(
+    "signals_db_query_duration_seconds", "Query execution and fetch time by query name.", ("query",)
+)
+QUERY_ROWS = Histogram(
+    "signals_db_query_rows", "Rows returned per query by query name.", ("query",), buckets=ROW_BUCKETS
+)
+POOL_WAIT = Histogram("signals_db_pool_wait_seconds", "Time spent waiting for a pooled connection.")
+EVALUATION_DURATION = Histogram(
+    "signals_evaluation_duration_seconds", "Python-side evaluation time by stage.", ("stage",)
+)
+CHANGE_FEED_EVENTS = Counter(
+    "signals_change_feed_events_total",
+    "Change feed notifications, recomputed users, published transitions and dropped subscribers.",
+    ("kind",),
+)
+COALESCED_USERS = Counter(
+    "signals_coalesced_users_total",
+    "Users taken from another request's in-flight evaluation, by evaluation kind.",
+    ("kind",),
+)
+FLIGHT_DURATION = Histogram(
+    "signals_coalesced_flight_seconds", "Duration of coalesced evaluations by kind.", ("kind",)
+)
+
+REGISTRY = (
+    HTTP_REQUESTS,
+    HTTP_DURATION,
+    QUERY_DURATION,
+    QUERY_ROWS,
+    POOL_WAIT,
+    EVALUATION_DURATION,
+    CHANGE_FEED_EVENTS,
+    COALESCED_USERS,
+    FLIGHT_DURATION,
+)
+
+# Per-request totals for the Server-Timing header, keyed by metric name ("db", "pool",
+# "eval"). Set by the HTTP middleware; asyncio.to_thread copies the context, so worker
+# threads add to the same dict.
+RequestTimings = Dict[str, List[float]]
+_request_timings: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+def _add_request_timing(key: str, seconds: float) -> None:
+    timings = _request_timings.get()
+    if timings is not None:
+        entry = timings.setdefault(key, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += 1
+
+
+def observe_query(name: str, seconds: float, rows: int) -> None:
+    if not METRICS_ENABLED:
+        return
+    QUERY_DURATION.observe(name, value=seconds)
+    QUERY_ROWS.observe(name, value=rows)
+    _add_request_timing("db", seconds)
+
+
+def observe_pool_wait(seconds: float) -> None:
+    if not METRICS_ENABLED:
+        return
+    POOL_WAIT.observe(value=seconds)
+    _add_request_timing("pool", seconds)
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    """Record the time spent in the block under signals_evaluation_duration_seconds."""
+    if not METRICS_ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        EVALUATION_DURATION.observe(stage, value=elapsed)
+        _add_request_timing("eval", elapsed)
+
+
+@contextmanager
+def track_request() -> Iterator[RequestTimings]:
+    """Collect this request's query, pool wait and evaluation totals."""
+    timings: RequestTimings = {}
+    token = _request_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _request_timings.reset(token)
+
+
+def observe_feed(kind: str, amount: int = 1) -> None:
+    if not METRICS_ENABLED or not amount:
+        return
+    CHANGE_FEED_EVENTS.inc(kind, amount=amount)
+
+
+def observe_flight(kind: str, seconds: float) -> None:
+    if not METRICS_ENABLED:
+        return
+    FLIGHT_DURATION.observe(kind, value=seconds)
+
+
+def observe_shared(kind: str, users: int) -> None:
+    if not METRICS_ENABLED or not users:
+        return
+    COALESCED_USERS.inc(kind, amount=users)
+
+
+def observe_request(method: str, route: str, status: int, seconds: float) -> None:
+    if not METRICS_ENABLED:
+        return
+    HTTP_REQUESTS.inc(method, route, str(status))
+    HTTP_DURATION.observe(method, route, value=seconds)
+
+
+def server_timing(timings: RequestTimings, total: float) -> str:
+    """Render a Server-Timing header value; durations are milliseconds."""
+    # Worker threads run concurrently, so db/pool/eval totals can exceed the wall time.
+    parts = [
+        f'{key};dur={seconds * 1000.0:.2f};desc="{count:.0f} calls"'
+        for key, (seconds, count) in sorted(timings.items())
+    ]
+    parts.append(f"total;dur={total * 1000.0:.2f}")
+    return ", ".join(parts)
+
+
+def render() -> str:
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+__all__ = [
+    "METRICS_ENABLED",
+    "SERVER_TIMING_ENABLED",
+    "observe_feed",
+    "observe_flight",
+    "observe_pool_wait",
+    "observe_query",
+    "observe_request",
+    "observe_shared",
+    "render",
+    "server_timing",
+    "timed",
+    "track_request",
+]
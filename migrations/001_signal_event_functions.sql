@@ -0,0 +1,96 @@
+--
+-- Event time / foreground-minute normalisation used by the signals service.
+--
+-- These functions mirror _event_time and _minutes_played in signals.py so activity can
+-- be bucketed inside Postgres. Only fixed, numeric formats are accepted and every value
+-- is assembled with make_timestamp(...) AT TIME ZONE 'UTC', so the result never depends
+-- on DateStyle or TimeZone and the functions are safe to declare IMMUTABLE.
+--
+
+CREATE OR REPLACE FUNCTION public.signal_event_ts(
+    raw_last_used bigint,
+    formatted_last_used character varying,
+    raw_date character varying,
+    created_at timestamp without time zone,
+    updated_at timestamp without time zone
+) RETURNS timestamp with time zone
+    -- The EXCEPTION blocks below start subtransactions, which parallel plans forbid.
+    LANGUAGE plpgsql IMMUTABLE PARALLEL UNSAFE
+    AS $$
+DECLARE
+    seconds double precision;
+    parts text[];
+BEGIN
+    -- Epoch seconds or milliseconds; the bounds match what Python's fromtimestamp accepts.
+    IF raw_last_used IS NOT NULL THEN
+        seconds := raw_last_used;
+        IF seconds > 1e12 THEN
+            seconds := seconds / 1000.0;
+        END IF;
+        IF seconds >= -62135596800 AND seconds < 253402300800 THEN
+            RETURN to_timestamp(seconds);
+        END IF;
+    END IF;
+
+    -- "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S" and "%Y-%m-%dT%H:%M:%S.%f".
+    IF formatted_last_used IS NOT NULL AND formatted_last_used <> '' THEN
+        parts := COALESCE(
+            regexp_match(formatted_last_used, '^(\d{4})-(\d{1,2})-(\d{1,2}) (\d{1,2}):(\d{1,2}):(\d{1,2})$'),
+            regexp_match(formatted_last_used, '^(\d{4})-(\d{1,2})-(\d{1,2})T(\d{1,2}):(\d{1,2}):(\d{1,2}(?:\.\d{1,6})?)$')
+        );
+        IF parts IS NOT NULL THEN
+            BEGIN
+                RETURN make_timestamp(
+                    parts[1]::int, parts[2]::int, parts[3]::int,
+                    parts[4]::int, parts[5]::int, parts[6]::double precision
+                ) AT TIME ZONE 'UTC';
+            EXCEPTION WHEN datetime_field_overflow OR invalid_parameter_value THEN
+                NULL;
+            END;
+        END IF;
+    END IF;
+
+    -- "%Y-%m-%d" and "%d/%m/%Y".
+    IF raw_date IS NOT NULL AND raw_date <> '' THEN
+        parts := regexp_match(raw_date, '^(\d{4})-(\d{1,2})-(\d{1,2})$');
+        IF parts IS NULL THEN
+            parts := regexp_match(raw_date, '^(\d{1,2})/(\d{1,2})/(\d{4})$');
+            IF parts IS NOT NULL THEN
+                parts := ARRAY[parts[3], parts[2], parts[1]];
+            END IF;
+        END IF;
+        IF parts IS NOT NULL THEN
+            BEGIN
+                RETURN make_timestamp(parts[1]::int, parts[2]::int, parts[3]::int, 0, 0, 0) AT TIME ZONE 'UTC';
+            EXCEPTION WHEN datetime_field_overflow OR invalid_parameter_value THEN
+                NULL;
+            END;
+        END IF;
+    END IF;
+
+    -- Naive row timestamps are stored in UTC.
+    IF created_at IS NOT NULL THEN
+        RETURN created_at AT TIME ZONE 'UTC';
+    END IF;
+    IF updated_at IS NOT NULL THEN
+        RETURN updated_at AT TIME ZONE 'UTC';
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+
+CREATE OR REPLACE FUNCTION public.signal_event_minutes(
+    foreground_minutes integer,
+    foreground bigint,
+    foreground_ms bigint
+) RETURNS double precision
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE
+    AS $$
+    SELECT CASE
+        WHEN foreground_minutes > 0 THEN foreground_minutes::double precision
+        WHEN foreground > 0 THEN foreground::double precision
+        WHEN foreground_ms > 0 THEN foreground_ms / 60000.0::double precision
+        ELSE 0::double precision
+    END
+$$;
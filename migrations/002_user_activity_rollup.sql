@@ -0,0 +1,34 @@
+--
+-- Incremental activity rollup maintained by rollup.py and read by SIGNAL_SOURCE=rollup.
+--
+-- user_activity_rollup keeps one row per user, UTC day and session. The first/last
+-- timestamps let the rolling 7-day windows used by the signals be evaluated exactly
+-- without going back to the raw events. user_activity_totals carries the all-time
+-- facts (event count, longest foreground time, last activity).
+--
+-- Progress is tracked in public.high_watermarks under source 'events_rollup', with the
+-- last folded events.id stored in last_processed_key.
+--
+
+CREATE TABLE IF NOT EXISTS public.user_activity_rollup (
+    user_id character varying(255) NOT NULL,
+    activity_date date NOT NULL,
+    session_key character varying(255) NOT NULL,
+    event_count bigint DEFAULT 0 NOT NULL,
+    max_minutes double precision DEFAULT 0 NOT NULL,
+    first_seen timestamp with time zone NOT NULL,
+    last_seen timestamp with time zone NOT NULL,
+    first_active timestamp with time zone,
+    last_active timestamp with time zone,
+    CONSTRAINT user_activity_rollup_pkey PRIMARY KEY (user_id, activity_date, session_key)
+);
+
+
+CREATE TABLE IF NOT EXISTS public.user_activity_totals (
+    user_id character varying(255) NOT NULL,
+    event_count bigint DEFAULT 0 NOT NULL,
+    max_minutes double precision DEFAULT 0 NOT NULL,
+    last_seen timestamp with time zone,
+    updated_at timestamp with time zone DEFAULT now() NOT NULL,
+    CONSTRAINT user_activity_totals_pkey PRIMARY KEY (user_id)
+);
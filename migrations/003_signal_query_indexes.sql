@@ -0,0 +1,29 @@
+--
+-- Composite indexes for the queries issued by signals.py and milestones.py.
+--
+-- The baseline only indexes events on single columns, so every per-user fetch sorts
+-- its rows and the milestone lookup reads all of a user's events to find the apps
+-- they used. Run `python index_advisor.py` to check the plans against a real database.
+--
+-- The indexes are built CONCURRENTLY so the events table stays writable; this cannot
+-- run inside a transaction, so apply the file with plain `psql -f` (not -1). If a build
+-- is interrupted, drop the INVALID index it leaves behind and re-run the file.
+--
+
+-- fetch_events_for_users: WHERE user_id = ANY(...) ORDER BY COALESCE(updated_at, created_at) DESC,
+-- and the max(COALESCE(updated_at, created_at)) half of fetch_event_fingerprints.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_events_user_id_last_changed
+    ON public.events USING btree (user_id, (COALESCE(updated_at, created_at)) DESC);
+
+-- fetch_event_fingerprints: max(id) per user.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_events_user_id_id
+    ON public.events USING btree (user_id, id);
+
+-- fetch_event_goal_subcategories: distinct package names per user, joined to apps."appId"
+-- (already unique-indexed by UQ_88d9328b5403a89eb94af4d5653).
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_events_user_id_package_name
+    ON public.events USING btree (user_id, package_name);
+
+-- goal_setting_completed and fetch_goal_subcategories_by_tier: covering lookup by user.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_user_goals_user_id
+    ON public.user_goals USING btree ("userId") INCLUDE ("goalId", "relationshipType");
@@ -0,0 +1,59 @@
+--
+-- Canonical per-event timestamp and foreground minutes, stored next to the raw columns.
+--
+-- event_ts / foreground_minutes hold what signal_event_ts / signal_event_minutes (001)
+-- compute from the raw columns, so the signal queries and the Python fallbacks no longer
+-- re-parse every row on every request. A trigger fills them for new rows and recomputes
+-- them whenever a source column changes; rows that existed before this migration are
+-- filled by `python backfill.py`. Readers treat NULL as "not backfilled yet" and fall
+-- back to the functions (SQL) or _event_time/_minutes_played (Python).
+--
+-- Adding nullable columns without a default only touches the catalog, so this does not
+-- rewrite or lock the table for long.
+--
+
+ALTER TABLE public.events
+    ADD COLUMN IF NOT EXISTS event_ts timestamp with time zone,
+    ADD COLUMN IF NOT EXISTS foreground_minutes double precision;
+
+
+CREATE OR REPLACE FUNCTION public.events_normalize() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+BEGIN
+    -- Values supplied on insert (e.g. by an ingestion job) are kept.
+    IF TG_OP = 'UPDATE' OR NEW.event_ts IS NULL THEN
+        NEW.event_ts := public.signal_event_ts(
+            NEW.last_time_used,
+            NEW.last_time_used_formatted,
+            NEW.date,
+            NEW.created_at,
+            NEW.updated_at
+        );
+    END IF;
+    IF TG_OP = 'UPDATE' OR NEW.foreground_minutes IS NULL THEN
+        NEW.foreground_minutes := public.signal_event_minutes(
+            NEW.total_time_in_foreground_minutes,
+            NEW.total_time_in_foreground,
+            NEW.total_time_in_foreground_ms
+        );
+    END IF;
+    RETURN NEW;
+END
+$$;
+
+
+DROP TRIGGER IF EXISTS events_normalize ON public.events;
+
+CREATE TRIGGER events_normalize
+    BEFORE INSERT OR UPDATE OF
+        last_time_used,
+        last_time_used_formatted,
+        date,
+        created_at,
+        updated_at,
+        total_time_in_foreground_minutes,
+        total_time_in_foreground,
+        total_time_in_foreground_ms
+    ON public.events
+    FOR EACH ROW EXECUTE FUNCTION public.events_normalize();
@@ -0,0 +1,17 @@
+--
+-- Latest signal and milestone evaluation per user, written by snapshots.py.
+--
+-- signals / milestones hold the same objects the /signals and /milestones endpoints
+-- return, so reports can read them directly (e.g. milestones->>'tier1_app_retained')
+-- and the endpoints can serve them with ?fresh=false. computed_at is when the row was
+-- last evaluated. Milestones that turn true between two runs are also appended to
+-- public.milestone_logs.
+--
+
+CREATE TABLE IF NOT EXISTS public.user_signal_snapshots (
+    user_id character varying(255) NOT NULL,
+    signals jsonb NOT NULL,
+    milestones jsonb NOT NULL,
+    computed_at timestamp with time zone DEFAULT now() NOT NULL,
+    CONSTRAINT user_signal_snapshots_pkey PRIMARY KEY (user_id)
+);
@@ -0,0 +1,20 @@
+--
+-- Indexes behind the bounded look-back reads in signals.py.
+--
+-- Signals only read the events of the last few weeks, found through event_ts (004).
+-- Rows that are not backfilled yet have a NULL event_ts and are always read. The two
+-- all-time facts ("has any event", "longest foreground time") are answered per user
+-- from the ends of an index instead of a scan of the user's whole history.
+--
+-- Built CONCURRENTLY like 003; apply with plain `psql -f` (not -1).
+--
+
+-- fetch_events_for_users / fetch_activity_summaries:
+-- WHERE user_id = ANY(...) AND (event_ts >= ... OR event_ts IS NULL).
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_events_user_id_event_ts
+    ON public.events USING btree (user_id, event_ts);
+
+-- fetch_lifetime_activity: max(foreground_minutes) per user, and the rows whose
+-- foreground_minutes IS NULL (not backfilled yet).
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_events_user_id_foreground_minutes
+    ON public.events USING btree (user_id, foreground_minutes);
@@ -0,0 +1,12 @@
+--
+-- Index behind the duplicate check in ingest.py.
+--
+-- A Firebase export record is a duplicate of an event with the same user, session and
+-- last_time_used. NULL session ids and times compare equal through the COALESCE, so
+-- the merge can probe this index for every staged row.
+--
+-- Built CONCURRENTLY like 003; apply with plain `psql -f` (not -1).
+--
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_events_dedupe_key
+    ON public.events USING btree (user_id, COALESCE(session_id, ''), COALESCE(last_time_used, -1));
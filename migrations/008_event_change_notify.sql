@@ -0,0 +1,27 @@
+--
+-- NOTIFY signal_events with the user id of every newly inserted event.
+--
+-- feed.py LISTENs on this channel, recomputes the user's signals and milestones and
+-- pushes the flags that changed to GET /signals/changes subscribers. The trigger runs
+-- once per statement and notifies each distinct user once, so a bulk load (COPY,
+-- ingest.py) sends one notification per user instead of one per row. Notifications are
+-- delivered when the inserting transaction commits and are dropped when it rolls back.
+--
+
+CREATE OR REPLACE FUNCTION public.events_notify_signal_change() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+BEGIN
+    PERFORM pg_notify('signal_events', changed.user_id)
+    FROM (SELECT DISTINCT user_id FROM new_events WHERE user_id IS NOT NULL) AS changed;
+    RETURN NULL;
+END
+$$;
+
+
+DROP TRIGGER IF EXISTS events_notify_signal_change ON public.events;
+
+CREATE TRIGGER events_notify_signal_change
+    AFTER INSERT ON public.events
+    REFERENCING NEW TABLE AS new_events
+    FOR EACH STATEMENT EXECUTE FUNCTION public.events_notify_signal_change();
@@ -0,0 +1,12 @@
+--
+-- Index behind the first-snapshot check in snapshots.py.
+--
+-- A user without a previous snapshot may already have milestone_logs rows written by
+-- the apps; the job looks up each such user's logged milestones before appending its
+-- own transitions, so that lookup must not scan the whole table.
+--
+-- Built CONCURRENTLY like 003; apply with plain `psql -f` (not -1).
+--
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_milestone_logs_user_id_milestone_id
+    ON public.milestone_logs USING btree (user_id, milestone_id);
@@ -1,39 +1,29 @@
 """Milestone evaluation tied to customer engagement signals."""
 from __future__ import annotations
 
-import os
-from typing import Dict, Iterable, List, Optional, Sequence, Set
-
-from dotenv import load_dotenv
-from psycopg2 import pool
-from psycopg2.extras import RealDictCursor
-
-# Ensure environment overrides match runtime configuration.
-load_dotenv(override=True)
-
-DATABASE_URL = os.getenv("DATABASE_URL")
-if not DATABASE_URL:
-    raise RuntimeError("DATABASE_URL must be configured for milestone evaluation.")
-
-_connection_pool: pool.SimpleConnectionPool | None = None
-
-
-def _get_connection_pool() -> pool.SimpleConnectionPool:
-    global _connection_pool
-    if _connection_pool is None:
-        _connection_pool = pool.SimpleConnectionPool(minconn=1, maxconn=10, dsn=DATABASE_URL)
-    return _connection_pool
-
-
-def _execute_query(query: str, params: Iterable[object]) -> List[Dict[str, object]]:
-    conn_pool = _get_connection_pool()
-    conn = conn_pool.getconn()
-    try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute(query, tuple(params))
-            return [dict(row) for row in cur.fetchall()]
-    finally:
-        conn_pool.putconn(conn)
+from typing import Dict, Optional, Sequence, Set
+
+from catalog import app_catalog
+from db import execute_query, is_uuid
+from metrics import timed
+
+# Users per tier-activity query.
+TIER_ACTIVITY_BATCH_SIZE = 500
+
+# Keys of a milestone summary, in the order compact responses number them (bit 0 first).
+MILESTONE_FLAGS = (
+    "goal_setting_complete",
+    "tier1_app_registered",
+    "tier2_app_registered",
+    "tier1_app_engaged",
+    "tier2_app_engaged",
+    "tier1_app_engagement_dropoff",
+    "tier2_app_engagement_dropoff",
+    "tier1_app_retained",
+    "tier2_app_retained",
+    "tier1_app_retention_dropoff",
+    "tier2_app_retention_dropoff",
+)
 
 
 def _relationship_to_tier(relationship: Optional[str]) -> Optional[str]:
@@ -60,7 +50,7 @@ def fetch_goal_subcategories_by_tier(user_id: str) -> Dict[str, Set[str]]:
           AND g."goalSubCategoryId" IS NOT NULL
     """
 
-    rows = _execute_query(query, (user_id,))
+    rows = execute_query(query, (user_id,), name="fetch_goal_subcategories_by_tier")
     tiers: Dict[str, Set[str]] = {"tier1": set(), "tier2": set(), "tier3": set()}
 
     for row in rows:
@@ -74,30 +64,92 @@ def fetch_goal_subcategories_by_tier(user_id: str) -> Dict[str, Set[str]]:
 
 def fetch_event_goal_subcategories(user_id: str) -> Set[str]:
     query = """
-        SELECT DISTINCT agsc."goalSubCategoriesId" AS goal_subcategory_id
-        FROM public.events AS e
-        JOIN public.apps AS a ON a."appId" = e.package_name
-        JOIN public.app_goal_sub_categories AS agsc ON agsc."appsId" = a.id
-        WHERE e.user_id = %s
+        SELECT DISTINCT package_name
+        FROM public.events
+        WHERE user_id = %s
     """
 
-    rows = _execute_query(query, (user_id,))
-    return {str(row["goal_subcategory_id"]) for row in rows if row.get("goal_subcategory_id")}
+    rows = execute_query(query, (user_id,), name="fetch_event_goal_subcategories")
+    return app_catalog.subcategories_for(row["package_name"] for row in rows)
 
 
-def _tier_has_matching_events(tiers: Dict[str, Set[str]], tier_key: str, event_subcategories: Set[str]) -> bool:
-    tier_subcategories = tiers.get(tier_key, set())
-    if not tier_subcategories:
-        return False
-    return bool(tier_subcategories & event_subcategories)
+def fetch_tier_activity(
+    user_ids: Sequence[str], *, batch_size: int = TIER_ACTIVITY_BATCH_SIZE
+) -> Dict[str, Dict[str, bool]]:
+    """Return ``{"tier1_active": ..., "tier2_active": ...}`` per user, set-based.
 
+    A tier is active when the user has an event for an app (per ``app_catalog``) in a
+    goal subcategory of one of their goals in that tier. Only the package names that
+    could match are read back from events. Users whose id is not a UUID cannot have
+    goals, so they are inactive in both tiers.
+    """
+    goals_query = """
+        SELECT
+            u.user_id,
+            ug."relationshipType" AS relationship,
+            g."goalSubCategoryId"::text AS goal_subcategory_id
+        FROM unnest(%s::text[], %s::uuid[]) AS u(user_id, uid)
+        JOIN public.user_goals AS ug ON ug."userId" = u.uid
+        JOIN public.goals AS g ON g.id = ug."goalId"
+        WHERE ug."relationshipType" IN ('primary', 'secondary')
+          AND g."goalSubCategoryId" IS NOT NULL
+    """
+    packages_query = """
+        SELECT DISTINCT user_id, package_name
+        FROM public.events
+        WHERE user_id = ANY(%s)
+          AND package_name = ANY(%s)
+    """
 
-def build_milestone_summary(user_id: str, *, signal_summary: Optional[Dict[str, bool]] = None) -> Dict[str, bool]:
+    activity = {uid: {"tier1_active": False, "tier2_active": False} for uid in user_ids}
+    valid_ids = [user_id for user_id in activity if is_uuid(user_id)]
+
+    for start in range(0, len(valid_ids), batch_size):
+        chunk = valid_ids[start : start + batch_size]
+        tiers: Dict[str, Dict[str, Set[str]]] = {}
+        tier_subcategories: Set[str] = set()
+        for row in execute_query(goals_query, (chunk, chunk), name="tier_activity_goals"):
+            tier = _relationship_to_tier(row["relationship"])
+            if tier:
+                subcategory = row["goal_subcategory_id"]
+                tiers.setdefault(row["user_id"], {}).setdefault(tier, set()).add(subcategory)
+                tier_subcategories.add(subcategory)
+
+        wanted = app_catalog.packages_for(tier_subcategories) if tier_subcategories else set()
+        if not wanted:
+            continue
+        packages: Dict[str, Set[str]] = {}
+        rows = execute_query(packages_query, (list(tiers), sorted(wanted)), name="tier_activity_packages")
+        for row in rows:
+            packages.setdefault(row["user_id"], set()).add(row["package_name"])
+
+        for user_id, package_names in packages.items():
+            event_subcategories = app_catalog.subcategories_for(package_names)
+            activity[user_id] = {
+                "tier1_active": bool(tiers[user_id].get("tier1", set()) & event_subcategories),
+                "tier2_active": bool(tiers[user_id].get("tier2", set()) & event_subcategories),
+            }
+    return activity
+
+
+def build_milestone_summary(
+    user_id: str,
+    *,
+    signal_summary: Optional[Dict[str, bool]] = None,
+    tier_activity: Optional[Dict[str, bool]] = None,
+) -> Dict[str, bool]:
     if signal_summary is None:
         from signals import build_signal_summary  # Lazy import to avoid circular dependency at import time.
 
         signal_summary = build_signal_summary(user_id)
+    if tier_activity is None:
+        tier_activity = fetch_tier_activity([user_id])[user_id]
 
+    return _milestone_flags(signal_summary, tier_activity)
+
+
+@timed("milestones")
+def _milestone_flags(signal_summary: Dict[str, bool], tier_activity: Dict[str, bool]) -> Dict[str, bool]:
     goal_setting_completed = bool(signal_summary.get("goal_setting_completed"))
     registration_completed = bool(signal_summary.get("customer_app_registration_completed"))
     engaged = bool(signal_summary.get("customer_app_engaged"))
@@ -105,11 +157,8 @@ def build_milestone_summary(user_id: str, *, signal_summary: Optional[Dict[str,
     retained = bool(signal_summary.get("customer_app_retained"))
     retention_dropoff = bool(signal_summary.get("customer_app_retained_dropoff"))
 
-    tiers = fetch_goal_subcategories_by_tier(user_id)
-    event_subcategories = fetch_event_goal_subcategories(user_id)
-
-    tier1_active = _tier_has_matching_events(tiers, "tier1", event_subcategories)
-    tier2_active = _tier_has_matching_events(tiers, "tier2", event_subcategories)
+    tier1_active = tier_activity["tier1_active"]
+    tier2_active = tier_activity["tier2_active"]
 
     return {
         "goal_setting_complete": goal_setting_completed,
@@ -126,19 +175,27 @@ def build_milestone_summary(user_id: str, *, signal_summary: Optional[Dict[str,
     }
 
 
-def build_milestone_summaries(user_ids: Sequence[str]) -> Dict[str, Dict[str, bool]]:
-    from signals import build_signal_summary  # Local import avoids circular reference.
+def build_milestone_summaries(
+    user_ids: Sequence[str], *, signal_summaries: Optional[Dict[str, Dict[str, bool]]] = None
+) -> Dict[str, Dict[str, bool]]:
+    if signal_summaries is None:
+        from signals import build_signal_summaries  # Local import avoids circular reference.
 
-    results: Dict[str, Dict[str, bool]] = {}
-    for user_id in user_ids:
-        summary = build_signal_summary(user_id)
-        results[user_id] = build_milestone_summary(user_id, signal_summary=summary)
-    return results
+        signal_summaries = build_signal_summaries(user_ids)
+    tier_activity = fetch_tier_activity(list(signal_summaries))
+    return {
+        user_id: build_milestone_summary(
+            user_id, signal_summary=summary, tier_activity=tier_activity[user_id]
+        )
+        for user_id, summary in signal_summaries.items()
+    }
 
 
 __all__ = [
+    "MILESTONE_FLAGS",
     "build_milestone_summary",
     "build_milestone_summaries",
     "fetch_goal_subcategories_by_tier",
     "fetch_event_goal_subcategories",
+    "fetch_tier_activity",
 ]
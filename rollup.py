@@ -0,0 +1,199 @@
+"""Background worker folding new events into the per-user activity rollup tables."""
+from __future__ import annotations
+
+import argparse
+import logging
+import time
+from typing import Optional, Tuple
+
+import db
+
+WATERMARK_SOURCE = "events_rollup"
+
+logger = logging.getLogger("rollup")
+
+# Folds events (id range) into both rollup tables in one statement. Undated events only
+# count towards the totals because they can never land in a look-back week.
+_FOLD_QUERY = """
+    WITH batch AS (
+        SELECT
+            e.user_id,
+            COALESCE(NULLIF(e.session_id, ''), NULLIF(e.id, 0)::text, '') AS session_key,
+            COALESCE(
+                e.foreground_minutes,
+                public.signal_event_minutes(
+                    e.total_time_in_foreground_minutes,
+                    e.total_time_in_foreground,
+                    e.total_time_in_foreground_ms
+                )
+            ) AS minutes,
+            COALESCE(
+                e.event_ts,
+                public.signal_event_ts(
+                    e.last_time_used,
+                    e.last_time_used_formatted,
+                    e.date,
+                    e.created_at,
+                    e.updated_at
+                )
+            ) AS event_ts
+        FROM public.events AS e
+        WHERE e.id > %s
+          AND e.id <= %s
+          AND e.user_id IS NOT NULL
+    ),
+    session_days AS (
+        INSERT INTO public.user_activity_rollup AS r (
+            user_id, activity_date, session_key, event_count, max_minutes,
+            first_seen, last_seen, first_active, last_active
+        )
+        SELECT
+            user_id,
+            (event_ts AT TIME ZONE 'UTC')::date,
+            session_key,
+            count(*),
+            max(minutes),
+            min(event_ts),
+            max(event_ts),
+            min(event_ts) FILTER (WHERE minutes > 0),
+            max(event_ts) FILTER (WHERE minutes > 0)
+        FROM batch
+        WHERE event_ts IS NOT NULL
+        GROUP BY 1, 2, 3
+        ON CONFLICT (user_id, activity_date, session_key) DO UPDATE SET
+            event_count = r.event_count + EXCLUDED.event_count,
+            max_minutes = GREATEST(r.max_minutes, EXCLUDED.max_minutes),
+            first_seen = LEAST(r.first_seen, EXCLUDED.first_seen),
+            last_seen = GREATEST(r.last_seen, EXCLUDED.last_seen),
+            first_active = LEAST(r.first_active, EXCLUDED.first_active),
+            last_active = GREATEST(r.last_active, EXCLUDED.last_active)
+        RETURNING 1
+    ),
+    totals AS (
+        INSERT INTO public.user_activity_totals AS t (user_id, event_count, max_minutes, last_seen)
+        SELECT user_id, count(*), max(minutes), max(event_ts)
+        FROM batch
+        GROUP BY user_id
+        ON CONFLICT (user_id) DO UPDATE SET
+            event_count = t.event_count + EXCLUDED.event_count,
+            max_minutes = GREATEST(t.max_minutes, EXCLUDED.max_minutes),
+            last_seen = GREATEST(t.last_seen, EXCLUDED.last_seen),
+            updated_at = now()
+    )
+    SELECT (SELECT count(*) FROM batch), (SELECT count(*) FROM session_days)
+"""
+
+
+class SettledHorizon:
+    """Tracks the highest events.id below which no transaction can still add rows.
+
+    Ids are drawn when a row is inserted but become visible only when its transaction
+    commits, so a lower id can appear after a higher one has been folded. An id that
+    was the highest visible one is settled once every transaction that was running at
+    that moment (xid below the snapshot's xmax) has finished, i.e. once the oldest
+    running xid has passed that xmax.
+    """
+
+    def __init__(self) -> None:
+        self.settled_id = 0
+        # (highest visible id, snapshot xmax) waiting for older transactions to end.
+        self.pending: Optional[Tuple[int, int]] = None
+
+    def update(self, cur) -> int:
+        # Run before the transaction writes anything, so its own xid is not in the way.
+        cur.execute(
+            """
+            SELECT
+                COALESCE((SELECT max(id) FROM public.events), 0),
+                pg_snapshot_xmin(pg_current_snapshot())::text::bigint,
+                pg_snapshot_xmax(pg_current_snapshot())::text::bigint
+            """
+        )
+        max_id, xmin, xmax = cur.fetchone()
+        if self.pending is not None and xmin >= self.pending[1]:
+            self.settled_id = max(self.settled_id, self.pending[0])
+            self.pending = None
+        if xmin >= xmax:
+            # Nothing is running, so every id up to max_id is final.
+            self.settled_id = max(self.settled_id, max_id)
+            self.pending = None
+        elif self.pending is None and max_id > self.settled_id:
+            self.pending = (max_id, xmax)
+        return self.settled_id
+
+
+def fold_batch(
+    conn,
+    *,
+    batch_size: int = 50_000,
+    source: str = WATERMARK_SOURCE,
+    horizon: Optional[SettledHorizon] = None,
+) -> int:
+    """Fold the next ``batch_size`` settled events into the rollup and advance the watermark.
+
+    The fold and the watermark update commit together, so a crash never double counts
+    or skips a batch. Returns the number of events folded (0 once caught up).
+
+    Only ids below ``horizon``'s settled id are folded, so rows of transactions that are
+    still running are waited for rather than skipped. Events are consumed in ``id``
+    order, so rows updated in place after being folded are not revisited.
+    """
+    horizon = horizon or SettledHorizon()
+    with conn:
+        with conn.cursor() as cur:
+            settled_id = horizon.update(cur)
+            last_id = db.lock_watermark(cur, source)
+            cur.execute(
+                """
+                SELECT max(id) FROM (
+                    SELECT id FROM public.events
+                    WHERE id > %s AND id <= %s
+                    ORDER BY id
+                    LIMIT %s
+                ) AS pending
+                """,
+                (last_id, settled_id, batch_size),
+            )
+            upper_id = cur.fetchone()[0]
+            if upper_id is None:
+                return 0
+
+            cur.execute(_FOLD_QUERY, (last_id, upper_id))
+            folded, session_days = cur.fetchone()
+            db.advance_watermark(cur, source, upper_id)
+    logger.info("folded %s events (%s session-days) up to id %s", folded, session_days, upper_id)
+    return folded
+
+
+def run(*, interval: float, batch_size: int, once: bool = False) -> None:
+    horizon = SettledHorizon()
+    while True:
+        with db.connection() as conn:
+            while fold_batch(conn, batch_size=batch_size, horizon=horizon):
+                pass
+            if once:
+                # Wait for the transactions that were running when the newest rows were
+                # seen, so a single run still catches up on a busy table.
+                target = horizon.pending[0] if horizon.pending else horizon.settled_id
+                while horizon.settled_id < target:
+                    time.sleep(1.0)
+                    while fold_batch(conn, batch_size=batch_size, horizon=horizon):
+                        pass
+                return
+        time.sleep(interval)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--interval", type=float, default=30.0, help="seconds to sleep once caught up")
+    parser.add_argument("--batch-size", type=int, default=50_000, help="events folded per transaction")
+    parser.add_argument("--once", action="store_true", help="exit after catching up instead of polling")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    db.configure_pool(1)
+    run(interval=args.interval, batch_size=args.batch_size, once=args.once)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,52 @@
 """FastAPI app exposing customer engagement signals backed by Postgres events."""
 from __future__ import annotations
 
+import asyncio
+import functools
+import json
+import logging
 import os
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta, timezone
-from typing import Any, Dict, Iterable, List, Optional, Sequence
-
-from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, Query
-from psycopg2 import pool
-from psycopg2.extras import RealDictCursor
-
-# Load environment variables from a local .env file when present.
-load_dotenv(override=True)
-
-DATABASE_URL = os.getenv("DATABASE_URL")
-if not DATABASE_URL:
-    raise RuntimeError("DATABASE_URL must be configured (see .env.example).")
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+    Union,
+)
+from uuid import UUID
+
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+
+from cache import Fingerprint, summary_cache
+from coalesce import request_coalescer
+from catalog import app_catalog
+from db import execute_query, execute_rows, is_uuid, iter_batches
+from encoding import MEDIA_TYPES, compact_payload, dumps, negotiate
+from feed import CHANGE_FEED_ENABLED, change_feed, missing_migrations
+from metrics import (
+    SERVER_TIMING_ENABLED,
+    observe_request,
+    render as render_metrics,
+    server_timing,
+    timed,
+    track_request,
+)
 
 # Firebase credentials are stored in the environment for future use. They are not
 # required while Firebase data lives in the Postgres events table, but the fields
@@ -26,41 +57,91 @@ FIREBASE_CREDENTIALS_FILE = os.getenv("FIREBASE_CREDENTIALS_FILE")
 # Only this identifier needs to change when testing different users.
 DEFAULT_USER_ID = os.getenv("DEFAULT_USER_ID", "").strip() or None
 
-_connection_pool: pool.SimpleConnectionPool | None = None
-app = FastAPI(title="Customer Engagement Signals")
+# Upper bound on how many user IDs are sent to Postgres in a single ANY(%s) query.
+EVENT_FETCH_BATCH_SIZE = max(1, int(os.getenv("EVENT_FETCH_BATCH_SIZE", "500")))
+
+# Longest look-back, in weeks, needed by any signal (customer_app_retained_dropoff).
+LOOKBACK_WEEKS = 10
+
+# Weeks of events each flag reads. The all-time facts (any events at all, longest
+# foreground time) come from fetch_lifetime_activity instead, so login needs none.
+SIGNAL_LOOKBACK_WEEKS = {
+    "customer_app_registration_completed": 1,
+    "customer_app_login_completed": 0,
+    "customer_app_engaged": 3,
+    "customer_app_engagement_dropoff": 2,
+    "customer_app_retained": 9,
+    "customer_app_retained_dropoff": LOOKBACK_WEEKS,
+}
 
+# Where activity summaries come from: "aggregate" buckets events inside Postgres
+# (requires migrations/001_signal_event_functions.sql), "rollup" reads the tables kept
+# up to date by rollup.py, and "events" loads raw rows and buckets them in Python.
+SIGNAL_SOURCES = ("aggregate", "rollup", "events")
+SIGNAL_SOURCE = os.getenv("SIGNAL_SOURCE", "aggregate").strip().lower()
+if SIGNAL_SOURCE not in SIGNAL_SOURCES:
+    raise RuntimeError(f"SIGNAL_SOURCE must be one of {', '.join(SIGNAL_SOURCES)}.")
 
-def _get_connection_pool() -> pool.SimpleConnectionPool:
-    """Create (and reuse) a psycopg2 connection pool."""
-    global _connection_pool
-    if _connection_pool is None:
-        _connection_pool = pool.SimpleConnectionPool(minconn=1, maxconn=10, dsn=DATABASE_URL)
-    return _connection_pool
+# Largest number of users scored per round trip by POST /signals/bulk. Streams start
+# with small chunks so the first rows go out quickly, then double up to this size.
+BULK_CHUNK_SIZE = max(1, int(os.getenv("BULK_CHUNK_SIZE", "1000")))
+BULK_FIRST_CHUNK_SIZE = 50
 
+T = TypeVar("T")
 
-def _execute_query(query: str, params: Iterable[Any]) -> List[Dict[str, Any]]:
-    """Run a SELECT query and return rows as dictionaries."""
-    conn_pool = _get_connection_pool()
-    conn = conn_pool.getconn()
+logger = logging.getLogger("signals")
+
+
+async def _start_change_feed() -> None:
+    # Without its migrations the feed would never be notified, or fail every recompute.
+    # If the database cannot be checked yet, start anyway; the listener keeps retrying.
+    try:
+        missing = await asyncio.to_thread(missing_migrations)
+    except Exception:
+        logger.warning("could not check the change feed migrations", exc_info=True)
+        missing = []
+    if missing:
+        logger.error("change feed not started: apply %s first", ", ".join(missing))
+        return
+    change_feed.start(_build_milestone_payloads, fetch_snapshots)
+
+
+@asynccontextmanager
+async def _lifespan(_: FastAPI) -> AsyncIterator[None]:
+    # Load the app catalog up front so the first milestone request does not pay for it.
+    # An unreachable database must not stop the service from starting.
     try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute(query, tuple(params))
-            return [dict(row) for row in cur.fetchall()]
+        await asyncio.to_thread(app_catalog.refresh)
+    except Exception:
+        logger.warning("could not preload the app catalog", exc_info=True)
+    if CHANGE_FEED_ENABLED:
+        await _start_change_feed()
+    try:
+        yield
     finally:
-        conn_pool.putconn(conn)
+        await change_feed.stop()
+
 
+app = FastAPI(title="Customer Engagement Signals", lifespan=_lifespan)
 
-def _execute_scalar(query: str, params: Iterable[Any]) -> Any:
-    """Execute a query that returns a single scalar value."""
-    conn_pool = _get_connection_pool()
-    conn = conn_pool.getconn()
+
+@app.middleware("http")
+async def _instrument_requests(
+    request: Request, call_next: Callable[[Request], Awaitable[Response]]
+) -> Response:
+    started = time.perf_counter()
+    status = 500
     try:
-        with conn.cursor() as cur:
-            cur.execute(query, tuple(params))
-            result = cur.fetchone()
-            return result[0] if result else None
+        with track_request() as timings:
+            response = await call_next(request)
+        status = response.status_code
+        if SERVER_TIMING_ENABLED:
+            response.headers["Server-Timing"] = server_timing(timings, time.perf_counter() - started)
+        return response
     finally:
-        conn_pool.putconn(conn)
+        # Label by route template, not raw path, so the number of series stays bounded.
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        observe_request(request.method, route, status, time.perf_counter() - started)
 
 
 def _try_parse_datetime(value: str, formats: Iterable[str]) -> Optional[datetime]:
@@ -72,7 +153,12 @@ def _try_parse_datetime(value: str, formats: Iterable[str]) -> Optional[datetime
     return None
 
 
-def _event_time(event: Dict[str, Any]) -> Optional[datetime]:
+def _event_time(event: Event) -> Optional[datetime]:
+    # Precomputed by the events_normalize trigger / backfill.py (migration 004).
+    event_ts = event.get("event_ts")
+    if isinstance(event_ts, datetime):
+        return event_ts
+
     raw_last_used = event.get("last_time_used")
     if raw_last_used is not None:
         try:
@@ -109,7 +195,11 @@ def _event_time(event: Dict[str, Any]) -> Optional[datetime]:
     return None
 
 
-def _minutes_played(event: Dict[str, Any]) -> float:
+def _minutes_played(event: Event) -> float:
+    foreground_minutes = event.get("foreground_minutes")
+    if foreground_minutes is not None:
+        return float(foreground_minutes)
+
     for key in (
         "total_time_in_foreground_minutes",
         "total_time_in_foreground",
@@ -159,86 +249,534 @@ def _resolve_user_ids(raw_user_ids: Optional[Sequence[str]]) -> List[str]:
     return deduped
 
 
-def fetch_events(user_id: str) -> List[Dict[str, Any]]:
+def _chunked(items: Sequence[str], size: int) -> Iterator[List[str]]:
+    for start in range(0, len(items), size):
+        yield list(items[start : start + size])
+
+
+class EventRow(NamedTuple):
+    """An events row projected to the columns build_activity_index reads.
+
+    A tuple is a fraction of the size of a dict per row. ``get`` gives it the same
+    read access as the dicts the signal functions also accept. The raw time and
+    foreground fields are only filled while event_ts / foreground_minutes are not.
+    """
+
+    id: Optional[int]
+    session_id: Optional[str]
+    event_ts: Optional[datetime]
+    foreground_minutes: Optional[float]
+    last_time_used: Optional[int] = None
+    last_time_used_formatted: Optional[str] = None
+    date: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    total_time_in_foreground_minutes: Optional[int] = None
+    total_time_in_foreground: Optional[int] = None
+    total_time_in_foreground_ms: Optional[int] = None
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key) if key in _EVENT_ROW_FIELDS else default
+
+
+_EVENT_ROW_FIELDS = frozenset(EventRow._fields)
+
+# Anything the signal functions accept as one event.
+Event = Union[EventRow, Mapping[str, Any]]
+
+
+# user_id followed by the EventRow columns. The raw fallbacks are only sent for rows
+# whose stored event_ts / foreground_minutes are not backfilled yet.
+_EVENT_ROWS_QUERY = """
+    SELECT
+        user_id,
+        id,
+        session_id,
+        event_ts,
+        foreground_minutes,
+        CASE WHEN event_ts IS NULL THEN last_time_used END,
+        CASE WHEN event_ts IS NULL THEN last_time_used_formatted END,
+        CASE WHEN event_ts IS NULL THEN date END,
+        CASE WHEN event_ts IS NULL THEN created_at END,
+        CASE WHEN event_ts IS NULL THEN updated_at END,
+        CASE WHEN foreground_minutes IS NULL THEN total_time_in_foreground_minutes END,
+        CASE WHEN foreground_minutes IS NULL THEN total_time_in_foreground END,
+        CASE WHEN foreground_minutes IS NULL THEN total_time_in_foreground_ms END
+    FROM public.events
+    WHERE user_id = ANY(%s)
+      {window_filter}
+    {order_by}
+"""
+_EVENT_WINDOW_FILTER = "AND (event_ts >= %s OR event_ts IS NULL)"
+
+
+def fetch_events(user_id: str) -> List[EventRow]:
+    return fetch_events_for_users([user_id])[user_id]
+
+
+def fetch_events_for_users(
+    user_ids: Sequence[str], *, since: Optional[datetime] = None
+) -> Dict[str, List[EventRow]]:
+    """Load events for many users in chunked ``user_id = ANY(%s)`` queries.
+
+    Every requested user gets an entry (possibly empty), and each user's events keep
+    the ``COALESCE(updated_at, created_at) DESC`` ordering of the single-user query.
+    Only the EventRow columns are selected. With ``since``, only events whose stored
+    event_ts is at or after it are loaded, plus rows whose event_ts is not backfilled yet.
+    """
+    query = _EVENT_ROWS_QUERY.format(
+        window_filter=_EVENT_WINDOW_FILTER if since else "",
+        order_by="ORDER BY COALESCE(updated_at, created_at) DESC",
+    )
+    events_by_user: Dict[str, List[EventRow]] = {uid: [] for uid in user_ids}
+    for chunk in _chunked(list(events_by_user), EVENT_FETCH_BATCH_SIZE):
+        params = (chunk, since) if since else (chunk,)
+        for row in execute_rows(query, params, name="fetch_events_for_users"):
+            events_by_user[row[0]].append(EventRow._make(row[1:]))
+    return events_by_user
+
+
+def fetch_lifetime_activity(user_ids: Sequence[str]) -> Dict[str, Tuple[bool, float]]:
+    """Return ``(has any event, longest foreground minutes)`` per user, all-time.
+
+    Both come from the ends of an index (migration 006) rather than a scan of the
+    user's history; only rows whose foreground_minutes is not backfilled yet are
+    evaluated with signal_event_minutes.
+    """
     query = """
         SELECT
-            id,
-            android_version,
-            date,
-            device_model,
-            event_type,
-            is_scheduled,
-            last_time_used,
-            last_time_used_formatted,
-            package_name,
-            phone_number,
-            rank,
-            session_id,
-            total_time_in_foreground,
-            total_time_in_foreground_minutes,
-            total_time_in_foreground_ms,
-            user_id,
-            username,
-            created_at,
-            updated_at
-        FROM public.events
-        WHERE user_id = %s
-        ORDER BY COALESCE(updated_at, created_at) DESC
+            u.user_id,
+            EXISTS (SELECT 1 FROM public.events AS e WHERE e.user_id = u.user_id) AS has_events,
+            GREATEST(
+                (
+                    SELECT max(e.foreground_minutes)
+                    FROM public.events AS e
+                    WHERE e.user_id = u.user_id
+                ),
+                (
+                    SELECT max(
+                        public.signal_event_minutes(
+                            e.total_time_in_foreground_minutes,
+                            e.total_time_in_foreground,
+                            e.total_time_in_foreground_ms
+                        )
+                    )
+                    FROM public.events AS e
+                    WHERE e.user_id = u.user_id
+                      AND e.foreground_minutes IS NULL
+                )
+            ) AS max_minutes
+        FROM unnest(%s::text[]) AS u(user_id)
+    """
+    lifetime: Dict[str, Tuple[bool, float]] = {}
+    for chunk in _chunked(list(user_ids), EVENT_FETCH_BATCH_SIZE):
+        for row in execute_query(query, (chunk,), name="fetch_lifetime_activity"):
+            lifetime[row["user_id"]] = (row["has_events"], float(row["max_minutes"] or 0.0))
+    return lifetime
+
+
+def fetch_event_fingerprints(
+    user_ids: Sequence[str], *, now: Optional[datetime] = None
+) -> Dict[str, Fingerprint]:
+    """Return a cheap per-user change marker for validating cached summaries.
+
+    The marker changes when the user's newest event id or latest row timestamp changes,
+    and whenever the UTC (ISO) week rolls over.
+    """
+    now = now or datetime.now(tz=timezone.utc)
+    query = """
+        SELECT u.user_id, latest.max_id, latest.last_changed
+        FROM unnest(%s::text[]) AS u(user_id)
+        CROSS JOIN LATERAL (
+            SELECT
+                max(e.id) AS max_id,
+                max(COALESCE(e.updated_at, e.created_at)) AS last_changed
+            FROM public.events AS e
+            WHERE e.user_id = u.user_id
+        ) AS latest
+    """
+    week = tuple(now.isocalendar())[:2]
+    fingerprints: Dict[str, Fingerprint] = {}
+    for chunk in _chunked(list(user_ids), EVENT_FETCH_BATCH_SIZE):
+        for row in execute_query(query, (chunk,), name="fetch_event_fingerprints"):
+            fingerprints[row["user_id"]] = (row["max_id"], row["last_changed"], week)
+    return fingerprints
+
+
+def fetch_user_ids_page(*, after: Optional[str] = None, limit: int = 1000) -> List[str]:
+    """Return the next ``limit`` ``public.users`` ids in id order, starting after ``after``."""
+    query = """
+        SELECT id::text AS user_id
+        FROM public.users
+        WHERE %s::uuid IS NULL OR id > %s::uuid
+        ORDER BY id
+        LIMIT %s
+    """
+    rows = execute_query(query, (after, after, limit), name="fetch_user_ids_page")
+    return [row["user_id"] for row in rows]
+
+
+def fetch_all_user_ids(*, page_size: int = 10_000) -> List[str]:
+    """Every ``public.users`` id in id order, read ``page_size`` at a time."""
+    user_ids: List[str] = []
+    after: Optional[str] = None
+    while True:
+        page = fetch_user_ids_page(after=after, limit=page_size)
+        if not page:
+            return user_ids
+        user_ids.extend(page)
+        after = page[-1]
+
+
+def read_user_ids_file(path: str) -> List[str]:
+    """User ids from a file with one id per line; blank lines are skipped."""
+    with open(path, encoding="utf-8") as handle:
+        return [line.strip() for line in handle if line.strip()]
+
+
+def fetch_snapshots(user_ids: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+    """Rows of public.user_signal_snapshots (written by snapshots.py) keyed by user id."""
+    query = """
+        SELECT user_id, signals, milestones, computed_at
+        FROM public.user_signal_snapshots
+        WHERE user_id = ANY(%s)
     """
-    return _execute_query(query, (user_id,))
+    snapshots: Dict[str, Dict[str, Any]] = {}
+    for chunk in _chunked(list(user_ids), EVENT_FETCH_BATCH_SIZE):
+        for row in execute_query(query, (chunk,), name="fetch_snapshots"):
+            snapshots[row["user_id"]] = row
+    return snapshots
+
 
+def fetch_goal_settings(user_ids: Sequence[str]) -> Dict[str, bool]:
+    """Return whether each user has at least one goal, in one query per chunk.
 
-def _fetch_events_by_user(user_ids: Sequence[str]) -> Dict[str, List[Dict[str, Any]]]:
-    return {uid: fetch_events(uid) for uid in user_ids}
+    user_goals."userId" is a NOT NULL foreign key to users and "goalId" a foreign key to
+    goals, so a row with a goalId is enough; neither table needs to be joined. Ids that
+    are not UUIDs cannot have goals and are False without a query.
+    """
+    query = """
+        SELECT
+            u.user_id,
+            EXISTS (
+                SELECT 1
+                FROM public.user_goals AS ug
+                WHERE ug."userId" = u.uid
+                  AND ug."goalId" IS NOT NULL
+            ) AS completed
+        FROM unnest(%s::text[], %s::uuid[]) AS u(user_id, uid)
+    """
+    flags = {uid: False for uid in user_ids}
+    valid_ids = [user_id for user_id in flags if is_uuid(user_id)]
+
+    for chunk in _chunked(valid_ids, EVENT_FETCH_BATCH_SIZE):
+        for row in execute_query(query, (chunk, chunk), name="fetch_goal_settings"):
+            flags[row["user_id"]] = row["completed"]
+    return flags
 
 
 def goal_setting_completed(user_id: Optional[str]) -> bool:
-    params: List[Any] = []
-    where_clause = ""
-    if user_id:
-        where_clause = "WHERE u.id = %s"
-        params.append(user_id)
+    if not user_id:
+        return False
+    return fetch_goal_settings([user_id])[user_id]
+
+
+@dataclass
+class ActivityIndex:
+    """Activity facts gathered in a single pass over a user's events.
+
+    ``weekly_sessions[n]`` counts distinct sessions with foreground time whose event
+    time falls ``n`` whole weeks before ``now``; ``recent_sessions`` counts distinct
+    sessions seen during the last seven days regardless of foreground time.
+
+    When only a look-back window of events is read, ``event_count`` and the weeks
+    beyond the window cover just that window, while ``has_events`` and
+    ``max_minutes`` stay all-time.
+    """
+
+    has_events: bool = False
+    event_count: int = 0
+    max_minutes: float = 0.0
+    recent_sessions: int = 0
+    weekly_sessions: List[int] = field(default_factory=lambda: [0] * LOOKBACK_WEEKS)
+
+    def active_weeks(self, start: int, stop: int) -> bool:
+        return all(self.weekly_sessions[week] for week in range(start, stop))
+
+
+class ActivityIndexBuilder:
+    """Single-pass ActivityIndex construction that can be fed events in batches.
+
+    Holds only the running totals and the distinct session keys, so events can be
+    dropped as soon as they have been added. With ``since``, events whose time is
+    known and earlier are skipped, as fetch_activity_summaries skips them.
+    """
+
+    def __init__(self, *, now: Optional[datetime] = None, since: Optional[datetime] = None) -> None:
+        self.now = now or datetime.now(tz=timezone.utc)
+        self.since = since
+        self.cutoff = self.now - timedelta(days=7)
+        self.index = ActivityIndex()
+        self.recent_sessions: set[str] = set()
+        self.week_buckets: List[set[str]] = [set() for _ in range(LOOKBACK_WEEKS)]
+
+    def extend(self, events: Iterable[Event]) -> None:
+        now, since, cutoff, index = self.now, self.since, self.cutoff, self.index
+        recent_sessions, week_buckets = self.recent_sessions, self.week_buckets
+        for event in events:
+            event_time = _event_time(event)
+            if since is not None and event_time is not None and event_time < since:
+                continue
+
+            index.event_count += 1
+            minutes = _minutes_played(event)
+            if minutes > index.max_minutes:
+                index.max_minutes = minutes
+
+            if not event_time:
+                continue
+
+            if event_time >= cutoff:
+                session_identifier = event.get("session_id") or event.get("id")
+                if session_identifier:
+                    recent_sessions.add(str(session_identifier))
 
+            if minutes <= 0:
+                continue
+            weeks_back = (now - event_time).days // 7
+            if 0 <= weeks_back < LOOKBACK_WEEKS:
+                session = str(event.get("session_id") or event.get("id") or "unknown-session")
+                week_buckets[weeks_back].add(session)
+
+    def finish(self) -> ActivityIndex:
+        index = self.index
+        index.has_events = index.event_count > 0
+        index.recent_sessions = len(self.recent_sessions)
+        index.weekly_sessions = [len(bucket) for bucket in self.week_buckets]
+        return index
+
+
+@timed("activity_index")
+def build_activity_index(
+    events: Iterable[Event], *, now: Optional[datetime] = None
+) -> ActivityIndex:
+    builder = ActivityIndexBuilder(now=now)
+    builder.extend(events)
+    return builder.finish()
+
+
+def stream_activity_indexes(
+    user_ids: Sequence[str], *, since: Optional[datetime] = None, now: Optional[datetime] = None
+) -> Dict[str, ActivityIndex]:
+    """build_activity_index for many users without holding their events in memory.
+
+    Events are read from a server-side cursor DB_STREAM_BATCH_SIZE rows at a time and
+    folded into one ActivityIndexBuilder per user, so peak memory depends on the batch
+    size and the number of distinct sessions, not on how many events a user has.
+    """
+    now = now or datetime.now(tz=timezone.utc)
+    builders = {uid: ActivityIndexBuilder(now=now, since=since) for uid in user_ids}
+    query = _EVENT_ROWS_QUERY.format(window_filter=_EVENT_WINDOW_FILTER if since else "", order_by="")
+    for chunk in _chunked(list(builders), EVENT_FETCH_BATCH_SIZE):
+        params = (chunk, since) if since else (chunk,)
+        for batch in iter_batches(query, params, name="stream_activity_indexes"):
+            grouped: Dict[str, List[EventRow]] = {}
+            for row in batch:
+                grouped.setdefault(row[0], []).append(EventRow._make(row[1:]))
+            for uid, events in grouped.items():
+                # The builder work that build_activity_index times for the other callers.
+                with timed("activity_index"):
+                    builders[uid].extend(events)
+    with timed("activity_index"):
+        return {uid: builder.finish() for uid, builder in builders.items()}
+
+
+def _weekly_session_columns(week_filter: str) -> str:
+    """Render one distinct-session count per look-back week for an aggregate query."""
+    return ",\n".join(
+        "count(DISTINCT COALESCE(session_key, 'unknown-session')) "
+        f"FILTER (WHERE {week_filter.format(week=week)})"
+        for week in range(LOOKBACK_WEEKS)
+    )
+
+
+def _activity_index_from_row(row: Dict[str, Any]) -> ActivityIndex:
+    return ActivityIndex(
+        has_events=row["event_count"] > 0,
+        event_count=row["event_count"],
+        max_minutes=float(row["max_minutes"]),
+        recent_sessions=row["recent_sessions"],
+        weekly_sessions=list(row["weekly_sessions"]),
+    )
+
+
+def _apply_lifetime(
+    indexes: Dict[str, ActivityIndex], lifetime: Dict[str, Tuple[bool, float]]
+) -> Dict[str, ActivityIndex]:
+    for uid, (has_events, max_minutes) in lifetime.items():
+        index = indexes[uid]
+        index.has_events = index.has_events or has_events
+        index.max_minutes = max(index.max_minutes, max_minutes)
+    return indexes
+
+
+def fetch_activity_summaries(
+    user_ids: Sequence[str], *, now: Optional[datetime] = None, weeks: int = LOOKBACK_WEEKS
+) -> Dict[str, ActivityIndex]:
+    """Build activity indexes with the week bucketing done in Postgres.
+
+    Returns one compact row per user instead of every event. Only the last ``weeks``
+    weeks of events are aggregated (none for 0); the all-time facts come from
+    fetch_lifetime_activity. The stored event_ts / foreground_minutes columns are used
+    where present; other rows fall back to the SQL functions in
+    migrations/001_signal_event_functions.sql, which match _event_time/_minutes_played,
+    and are held to the same window by the time those resolve.
+    """
+    now = now or datetime.now(tz=timezone.utc)
+    query = """
+        WITH normalized AS (
+            SELECT
+                e.user_id,
+                COALESCE(NULLIF(e.session_id, ''), NULLIF(e.id, 0)::text) AS session_key,
+                COALESCE(
+                    e.foreground_minutes,
+                    public.signal_event_minutes(
+                        e.total_time_in_foreground_minutes,
+                        e.total_time_in_foreground,
+                        e.total_time_in_foreground_ms
+                    )
+                ) AS minutes,
+                COALESCE(
+                    e.event_ts,
+                    public.signal_event_ts(
+                        e.last_time_used,
+                        e.last_time_used_formatted,
+                        e.date,
+                        e.created_at,
+                        e.updated_at
+                    )
+                ) AS event_ts
+            FROM public.events AS e
+            WHERE e.user_id = ANY(%s)
+              AND (e.event_ts >= %s OR e.event_ts IS NULL)
+        ),
+        bucketed AS (
+            SELECT
+                normalized.*,
+                floor(extract(epoch FROM %s - event_ts) / 604800)::int AS weeks_back
+            FROM normalized
+            -- Rows that were not backfilled are held to the same window once resolved.
+            WHERE event_ts >= %s OR event_ts IS NULL
+        )
+        SELECT
+            user_id,
+            count(*) AS event_count,
+            COALESCE(max(minutes), 0) AS max_minutes,
+            count(DISTINCT session_key) FILTER (WHERE event_ts >= %s) AS recent_sessions,
+            ARRAY[{weekly_columns}] AS weekly_sessions
+        FROM bucketed
+        GROUP BY user_id
+    """.format(weekly_columns=_weekly_session_columns("minutes > 0 AND weeks_back = {week}"))
+
+    indexes: Dict[str, ActivityIndex] = {uid: ActivityIndex() for uid in user_ids}
+    cutoff = now - timedelta(days=7)
+    since = now - timedelta(weeks=weeks)
+    if weeks > 0:
+        for chunk in _chunked(list(indexes), EVENT_FETCH_BATCH_SIZE):
+            params = (chunk, since, now, since, cutoff)
+            rows = execute_query(query, params, name="fetch_activity_summaries")
+            for row in rows:
+                indexes[row["user_id"]] = _activity_index_from_row(row)
+    return _apply_lifetime(indexes, fetch_lifetime_activity(list(indexes)))
+
+
+def fetch_rollup_summaries(
+    user_ids: Sequence[str], *, now: Optional[datetime] = None
+) -> Dict[str, ActivityIndex]:
+    """Build activity indexes from the tables maintained by rollup.py.
+
+    Only the per-user totals row and the session-day rows inside the look-back window
+    are read, so the cost does not grow with the length of a user's history. Each
+    session-day row spans less than a week, so its first and last active timestamps
+    are enough to tell which rolling weeks it touched.
+    """
+    now = now or datetime.now(tz=timezone.utc)
     query = """
-        SELECT EXISTS (
-            SELECT 1
-            FROM public.user_goals AS ug
-            JOIN public.goals AS g ON g.id = ug."goalId"
-            JOIN public.users AS u ON u.id = ug."userId"
-            {where_clause}
+        SELECT
+            t.user_id,
+            t.event_count,
+            t.max_minutes,
+            w.recent_sessions,
+            w.weekly_sessions
+        FROM public.user_activity_totals AS t
+        CROSS JOIN LATERAL (
+            SELECT
+                count(DISTINCT session_key) FILTER (WHERE last_seen >= %s) AS recent_sessions,
+                ARRAY[{weekly_columns}] AS weekly_sessions
+            FROM (
+                SELECT
+                    NULLIF(r.session_key, '') AS session_key,
+                    r.last_seen,
+                    floor(extract(epoch FROM %s - r.first_active) / 604800)::int AS first_weeks_back,
+                    floor(extract(epoch FROM %s - r.last_active) / 604800)::int AS last_weeks_back
+                FROM public.user_activity_rollup AS r
+                WHERE r.user_id = t.user_id
+                  AND r.activity_date >= %s
+            ) AS session_days
+        ) AS w
+        WHERE t.user_id = ANY(%s)
+    """.format(
+        weekly_columns=_weekly_session_columns("first_weeks_back = {week} OR last_weeks_back = {week}")
+    )
+
+    indexes: Dict[str, ActivityIndex] = {uid: ActivityIndex() for uid in user_ids}
+    cutoff = now - timedelta(days=7)
+    earliest_date = (now - timedelta(weeks=LOOKBACK_WEEKS)).date()
+    for chunk in _chunked(list(indexes), EVENT_FETCH_BATCH_SIZE):
+        rows = execute_query(
+            query, (cutoff, now, now, earliest_date, chunk), name="fetch_rollup_summaries"
         )
-    """.format(where_clause=where_clause)
+        for row in rows:
+            indexes[row["user_id"]] = _activity_index_from_row(row)
+    return indexes
 
-    return bool(_execute_scalar(query, params))
 
+def _fetch_activity_indexes(
+    user_ids: Sequence[str], *, weeks: int = LOOKBACK_WEEKS
+) -> Dict[str, ActivityIndex]:
+    """Activity indexes from SIGNAL_SOURCE, covering at least the last ``weeks`` weeks."""
+    if SIGNAL_SOURCE == "events":
+        now = datetime.now(tz=timezone.utc)
+        indexes = {uid: ActivityIndex() for uid in user_ids}
+        if weeks > 0:
+            indexes = stream_activity_indexes(user_ids, since=now - timedelta(weeks=weeks), now=now)
+        return _apply_lifetime(indexes, fetch_lifetime_activity(list(indexes)))
+    if SIGNAL_SOURCE == "rollup":
+        # The rollup already reads only the look-back window plus one totals row.
+        return fetch_rollup_summaries(user_ids)
+    return fetch_activity_summaries(user_ids, weeks=weeks)
 
-def customer_app_login_completed(events: List[Dict[str, Any]], *, min_minutes: float = 1.0) -> bool:
-    return any(_minutes_played(event) >= min_minutes for event in events)
 
+def _indexes_for(signal: str) -> Callable[[Sequence[str]], Dict[str, ActivityIndex]]:
+    """Batched index fetch reading only the weeks ``signal`` needs."""
+    return functools.partial(_fetch_activity_indexes, weeks=SIGNAL_LOOKBACK_WEEKS[signal])
 
-def customer_app_registration_completed(
-    events: List[Dict[str, Any]], *, min_minutes: float = 4.0, min_weekly_sessions: int = 4
+
+def _login_completed(index: ActivityIndex, *, min_minutes: float = 1.0) -> bool:
+    return index.has_events and index.max_minutes >= min_minutes
+
+
+def _registration_details(
+    index: ActivityIndex, *, min_minutes: float = 4.0, min_weekly_sessions: int = 4
 ) -> Dict[str, Any]:
-    cutoff = datetime.now(tz=timezone.utc) - timedelta(days=7)
-    max_minutes = max((_minutes_played(evt) for evt in events), default=0.0)
-    recent_sessions: set[str] = set()
-    for evt in events:
-        event_time = _event_time(evt)
-        if not event_time or event_time < cutoff:
-            continue
-        session_identifier = evt.get("session_id") or evt.get("id")
-        if not session_identifier:
-            continue
-        recent_sessions.add(str(session_identifier))
-    weekly_sessions = len(recent_sessions)
-    used_app = bool(events)
-    meets_minutes = max_minutes >= min_minutes
-    meets_sessions = weekly_sessions >= min_weekly_sessions
+    used_app = index.has_events
+    meets_minutes = index.max_minutes >= min_minutes
+    meets_sessions = index.recent_sessions >= min_weekly_sessions
     completed = used_app and (meets_minutes or meets_sessions)
     return {
-        "event_count": len(events),
-        "max_minutes": max_minutes,
-        "weekly_sessions": weekly_sessions,
+        "event_count": index.event_count,
+        "max_minutes": index.max_minutes,
+        "weekly_sessions": index.recent_sessions,
         "thresholds": {
             "min_foreground_minutes": min_minutes,
             "min_weekly_sessions": min_weekly_sessions,
@@ -249,109 +787,250 @@ def customer_app_registration_completed(
             "meets_weekly_threshold": meets_sessions,
             "completed": completed,
         },
-        "events": events,
     }
 
 
-def customer_app_engaged(events: List[Dict[str, Any]]) -> bool:
-    now = datetime.now(tz=timezone.utc)
-    week_buckets = [set() for _ in range(3)]
+def _engaged(index: ActivityIndex) -> bool:
+    return index.active_weeks(0, 3)
 
-    for event in events:
-        minutes = _minutes_played(event)
-        if minutes <= 0:
-            continue
-        event_time = _event_time(event)
-        if not event_time:
-            continue
-        weeks_back = (now - event_time).days // 7
-        if 0 <= weeks_back < len(week_buckets):
-            session = str(event.get("session_id") or event.get("id") or "unknown-session")
-            week_buckets[weeks_back].add(session)
 
-    return all(bucket for bucket in week_buckets)
+def _engagement_dropoff(index: ActivityIndex) -> bool:
+    return bool(index.weekly_sessions[1]) and not index.weekly_sessions[0]
 
 
-def customer_app_engagement_dropoff(events: List[Dict[str, Any]]) -> bool:
-    now = datetime.now(tz=timezone.utc)
-    current_week_active = False
-    previous_week_active = False
+def _retained(index: ActivityIndex) -> bool:
+    return index.active_weeks(0, 9)
 
-    for event in events:
-        minutes = _minutes_played(event)
-        if minutes <= 0:
-            continue
-        event_time = _event_time(event)
-        if not event_time:
-            continue
-        weeks_back = (now - event_time).days // 7
-        if weeks_back == 0:
-            current_week_active = True
-        elif weeks_back == 1:
-            previous_week_active = True
 
-    return previous_week_active and not current_week_active
+def _retained_dropoff(index: ActivityIndex) -> bool:
+    return index.active_weeks(1, 10) and not index.weekly_sessions[0]
 
 
-def customer_app_retained(events: List[Dict[str, Any]]) -> bool:
-    now = datetime.now(tz=timezone.utc)
-    week_buckets = [set() for _ in range(9)]
+def _registration_completed(index: ActivityIndex) -> bool:
+    return _registration_details(index)["evaluation"]["completed"]
 
-    for event in events:
-        minutes = _minutes_played(event)
-        if minutes <= 0:
-            continue
-        event_time = _event_time(event)
-        if not event_time:
-            continue
-        weeks_back = (now - event_time).days // 7
-        if 0 <= weeks_back < len(week_buckets):
-            session = str(event.get("session_id") or event.get("id") or "unknown-session")
-            week_buckets[weeks_back].add(session)
 
-    return all(bucket for bucket in week_buckets)
+_SIGNAL_EVALUATORS: Dict[str, Callable[[ActivityIndex], bool]] = {
+    "customer_app_registration_completed": _registration_completed,
+    "customer_app_login_completed": _login_completed,
+    "customer_app_engaged": _engaged,
+    "customer_app_engagement_dropoff": _engagement_dropoff,
+    "customer_app_retained": _retained,
+    "customer_app_retained_dropoff": _retained_dropoff,
+}
 
+# Keys of a signal summary, in the order compact responses number them (bit 0 first).
+SIGNAL_FLAGS = ("goal_setting_completed", *_SIGNAL_EVALUATORS)
 
-def customer_app_retained_dropoff(events: List[Dict[str, Any]]) -> bool:
-    now = datetime.now(tz=timezone.utc)
-    week_buckets = [set() for _ in range(10)]
 
-    for event in events:
-        minutes = _minutes_played(event)
-        if minutes <= 0:
-            continue
-        event_time = _event_time(event)
-        if not event_time:
-            continue
-        weeks_back = (now - event_time).days // 7
-        if 0 <= weeks_back < len(week_buckets):
-            session = str(event.get("session_id") or event.get("id") or "unknown-session")
-            week_buckets[weeks_back].add(session)
+def evaluate_signals(index: ActivityIndex) -> Dict[str, bool]:
+    """Derive every event-based signal flag from a prebuilt activity index."""
+    flags: Dict[str, bool] = {}
+    for name, evaluate in _SIGNAL_EVALUATORS.items():
+        with timed(name):
+            flags[name] = evaluate(index)
+    return flags
+
+
+def customer_app_login_completed(events: List[Event], *, min_minutes: float = 1.0) -> bool:
+    return _login_completed(build_activity_index(events), min_minutes=min_minutes)
+
+
+def customer_app_registration_completed(
+    events: List[Event],
+    *,
+    min_minutes: float = 4.0,
+    min_weekly_sessions: int = 4,
+    include_events: bool = False,
+) -> Dict[str, Any]:
+    """Registration evaluation details; ``include_events`` adds the events as dicts (debugging)."""
+    details = _registration_details(
+        build_activity_index(events), min_minutes=min_minutes, min_weekly_sessions=min_weekly_sessions
+    )
+    if include_events:
+        details["events"] = [
+            event._asdict() if isinstance(event, EventRow) else dict(event) for event in events
+        ]
+    return details
+
+
+def customer_app_engaged(events: List[Event]) -> bool:
+    return _engaged(build_activity_index(events))
+
+
+def customer_app_engagement_dropoff(events: List[Event]) -> bool:
+    return _engagement_dropoff(build_activity_index(events))
+
+
+def customer_app_retained(events: List[Event]) -> bool:
+    return _retained(build_activity_index(events))
+
+
+def customer_app_retained_dropoff(events: List[Event]) -> bool:
+    return _retained_dropoff(build_activity_index(events))
+
+
+def build_signal_summary(
+    user_id: str,
+    *,
+    events: Optional[List[Event]] = None,
+    index: Optional[ActivityIndex] = None,
+    goal_setting: Optional[bool] = None,
+) -> Dict[str, bool]:
+    if index is None and events is not None:
+        index = build_activity_index(events)
+    elif index is None:
+        index = _fetch_activity_indexes([user_id])[user_id]
+    if goal_setting is None:
+        goal_setting = goal_setting_completed(user_id)
+    summary = {"goal_setting_completed": goal_setting}
+    summary.update(evaluate_signals(index))
+    return summary
+
+
+def build_signal_summaries(user_ids: Sequence[str]) -> Dict[str, Dict[str, bool]]:
+    indexes = _fetch_activity_indexes(user_ids)
+    goals = fetch_goal_settings(list(indexes))
+    return {
+        uid: build_signal_summary(uid, index=index, goal_setting=goals[uid])
+        for uid, index in indexes.items()
+    }
+
+
+async def _fan_out(
+    fetch: Callable[[Sequence[str]], Dict[str, T]], user_ids: Sequence[str]
+) -> Dict[str, T]:
+    """Run a batched fetch for each chunk of ``user_ids`` concurrently in worker threads."""
+    chunks = list(_chunked(user_ids, EVENT_FETCH_BATCH_SIZE))
+    results = await asyncio.gather(*(asyncio.to_thread(fetch, chunk) for chunk in chunks))
+    merged: Dict[str, T] = {}
+    for result in results:
+        merged.update(result)
+    return merged
+
+
+async def build_signal_summaries_async(user_ids: Sequence[str]) -> Dict[str, Dict[str, bool]]:
+    """Async counterpart of build_signal_summaries with events and goals fetched concurrently."""
+    indexes, goals = await asyncio.gather(
+        _fan_out(_fetch_activity_indexes, user_ids),
+        _fan_out(fetch_goal_settings, user_ids),
+    )
+    return {
+        uid: build_signal_summary(uid, index=indexes[uid], goal_setting=goals[uid]) for uid in user_ids
+    }
+
+
+async def _cached_summaries(
+    kind: str,
+    user_ids: Sequence[str],
+    compute: Callable[[Sequence[str]], Awaitable[Dict[str, T]]],
+) -> Dict[str, T]:
+    """Serve per-user summaries from summary_cache, computing only stale or missing users."""
+    if not summary_cache.enabled:
+        return await compute(user_ids)
+
+    fingerprints = await _fan_out(fetch_event_fingerprints, user_ids)
+    summaries, missing = summary_cache.lookup(kind, fingerprints)
+    if missing:
+        computed = await compute(missing)
+        summary_cache.store(kind, computed, fingerprints)
+        summaries.update(computed)
+    return {uid: summaries[uid] for uid in user_ids}
+
+
+def _snapshot_payload(kind: str, user_id: str, snapshot: Dict[str, Any]) -> Dict[str, Any]:
+    if kind == "milestones":
+        return {"user_id": user_id, "signals": snapshot["signals"], "milestones": snapshot["milestones"]}
+    return snapshot["signals"]
+
+
+async def _summaries(
+    kind: str,
+    user_ids: Sequence[str],
+    compute: Callable[[Sequence[str]], Awaitable[Dict[str, Any]]],
+    *,
+    fresh: bool,
+) -> Dict[str, Any]:
+    """Per-user summaries, read from user_signal_snapshots when ``fresh`` is False.
+
+    Users without a snapshot yet are computed as usual. Concurrent requests computing
+    the same user share one computation.
+    """
+
+    async def compute_fresh(ids: Sequence[str]) -> Dict[str, Any]:
+        return await _cached_summaries(kind, ids, compute)
+
+    if fresh:
+        return await request_coalescer.run(kind, user_ids, compute_fresh)
+
+    snapshots = await asyncio.to_thread(fetch_snapshots, user_ids)
+    summaries = {uid: _snapshot_payload(kind, uid, snapshot) for uid, snapshot in snapshots.items()}
+    missing = [uid for uid in user_ids if uid not in summaries]
+    if missing:
+        summaries.update(await request_coalescer.run(kind, missing, compute_fresh))
+    return {uid: summaries[uid] for uid in user_ids}
+
+
+async def _flag_values(flag: str, user_ids: Sequence[str]) -> Dict[str, bool]:
+    """One signal flag per user, reading only the weeks the flag needs."""
+
+    async def compute(ids: Sequence[str]) -> Dict[str, bool]:
+        indexes = await _fan_out(_indexes_for(flag), ids)
+        return {uid: _SIGNAL_EVALUATORS[flag](index) for uid, index in indexes.items()}
 
-    previous_nine_active = all(week_buckets[i] for i in range(1, 10))
-    current_week_inactive = not week_buckets[0]
-    return previous_nine_active and current_week_inactive
+    return await request_coalescer.run(flag, user_ids, compute)
 
 
-def build_signal_summary(user_id: str) -> Dict[str, bool]:
-    events = fetch_events(user_id)
-    registration = customer_app_registration_completed(events)
+async def _snapshot_flags(user_ids: Sequence[str], flag: str) -> Dict[str, bool]:
+    summaries = await _summaries("signals", user_ids, build_signal_summaries_async, fresh=False)
+    return {uid: summary[flag] for uid, summary in summaries.items()}
+
+
+async def _build_milestone_payloads(user_ids: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+    from milestones import build_milestone_summary, fetch_tier_activity
+
+    signal_summaries, tier_activity = await asyncio.gather(
+        build_signal_summaries_async(user_ids),
+        _fan_out(fetch_tier_activity, user_ids),
+    )
     return {
-        "goal_setting_completed": goal_setting_completed(user_id),
-        "customer_app_registration_completed": registration["evaluation"]["completed"],
-        "customer_app_login_completed": customer_app_login_completed(events),
-        "customer_app_engaged": customer_app_engaged(events),
-        "customer_app_engagement_dropoff": customer_app_engagement_dropoff(events),
-        "customer_app_retained": customer_app_retained(events),
-        "customer_app_retained_dropoff": customer_app_retained_dropoff(events),
+        uid: {
+            "user_id": uid,
+            "signals": signal_summary,
+            "milestones": build_milestone_summary(
+                uid, signal_summary=signal_summary, tier_activity=tier_activity[uid]
+            ),
+        }
+        for uid, signal_summary in signal_summaries.items()
     }
 
 
+def _response_format(requested: Optional[str], request: Request) -> Optional[str]:
+    try:
+        return negotiate(requested, request.headers.get("accept"))
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+
+def _encoded_response(response_format: str, payload: Dict[str, Any]) -> Response:
+    """Serialise straight to bytes, skipping FastAPI's jsonable_encoder pass."""
+    return Response(dumps(payload), media_type=MEDIA_TYPES[response_format])
+
+
 @app.get("/goal-setting-completed")
-def goal_setting_endpoint(user_id: Optional[List[str]] = Query(default=None)) -> Dict[str, Any]:
+async def goal_setting_endpoint(
+    user_id: Optional[List[str]] = Query(default=None), fresh: bool = True
+) -> Dict[str, Any]:
     resolved_user_ids = _resolve_user_ids(user_id)
     try:
-        per_user = {uid: goal_setting_completed(uid) for uid in resolved_user_ids}
+        if fresh:
+            per_user = await request_coalescer.run(
+                "goal_setting_completed",
+                resolved_user_ids,
+                functools.partial(_fan_out, fetch_goal_settings),
+            )
+        else:
+            per_user = await _snapshot_flags(resolved_user_ids, "goal_setting_completed")
         value = next(iter(per_user.values())) if len(per_user) == 1 else per_user
         return {"goal_setting_completed": value}
     except Exception as exc:
@@ -359,14 +1038,15 @@ def goal_setting_endpoint(user_id: Optional[List[str]] = Query(default=None)) ->
 
 
 @app.get("/customer-app-registration-completed")
-def registration_completed_endpoint(user_id: Optional[List[str]] = Query(default=None)) -> Dict[str, Any]:
+async def registration_completed_endpoint(
+    user_id: Optional[List[str]] = Query(default=None), fresh: bool = True
+) -> Dict[str, Any]:
     resolved_user_ids = _resolve_user_ids(user_id)
     try:
-        events_by_user = _fetch_events_by_user(resolved_user_ids)
-        per_user = {
-            uid: customer_app_registration_completed(events)["evaluation"]["completed"]
-            for uid, events in events_by_user.items()
-        }
+        if fresh:
+            per_user = await _flag_values("customer_app_registration_completed", resolved_user_ids)
+        else:
+            per_user = await _snapshot_flags(resolved_user_ids, "customer_app_registration_completed")
         value = next(iter(per_user.values())) if len(per_user) == 1 else per_user
         return {"customer_app_registration_completed": value}
     except Exception as exc:
@@ -374,11 +1054,15 @@ def registration_completed_endpoint(user_id: Optional[List[str]] = Query(default
 
 
 @app.get("/customer-app-login-completed")
-def login_completed_endpoint(user_id: Optional[List[str]] = Query(default=None)) -> Dict[str, Any]:
+async def login_completed_endpoint(
+    user_id: Optional[List[str]] = Query(default=None), fresh: bool = True
+) -> Dict[str, Any]:
     resolved_user_ids = _resolve_user_ids(user_id)
     try:
-        events_by_user = _fetch_events_by_user(resolved_user_ids)
-        per_user = {uid: customer_app_login_completed(events) for uid, events in events_by_user.items()}
+        if fresh:
+            per_user = await _flag_values("customer_app_login_completed", resolved_user_ids)
+        else:
+            per_user = await _snapshot_flags(resolved_user_ids, "customer_app_login_completed")
         value = next(iter(per_user.values())) if len(per_user) == 1 else per_user
         return {"customer_app_login_completed": value}
     except Exception as exc:
@@ -386,11 +1070,15 @@ def login_completed_endpoint(user_id: Optional[List[str]] = Query(default=None))
 
 
 @app.get("/customer-app-engaged")
-def engaged_endpoint(user_id: Optional[List[str]] = Query(default=None)) -> Dict[str, Any]:
+async def engaged_endpoint(
+    user_id: Optional[List[str]] = Query(default=None), fresh: bool = True
+) -> Dict[str, Any]:
     resolved_user_ids = _resolve_user_ids(user_id)
     try:
-        events_by_user = _fetch_events_by_user(resolved_user_ids)
-        per_user = {uid: customer_app_engaged(events) for uid, events in events_by_user.items()}
+        if fresh:
+            per_user = await _flag_values("customer_app_engaged", resolved_user_ids)
+        else:
+            per_user = await _snapshot_flags(resolved_user_ids, "customer_app_engaged")
         value = next(iter(per_user.values())) if len(per_user) == 1 else per_user
         return {"customer_app_engaged": value}
     except Exception as exc:
@@ -398,14 +1086,15 @@ def engaged_endpoint(user_id: Optional[List[str]] = Query(default=None)) -> Dict
 
 
 @app.get("/customer-app-engagement-dropoff")
-def engagement_dropoff_endpoint(user_id: Optional[List[str]] = Query(default=None)) -> Dict[str, Any]:
+async def engagement_dropoff_endpoint(
+    user_id: Optional[List[str]] = Query(default=None), fresh: bool = True
+) -> Dict[str, Any]:
     resolved_user_ids = _resolve_user_ids(user_id)
     try:
-        events_by_user = _fetch_events_by_user(resolved_user_ids)
-        per_user = {
-            uid: customer_app_engagement_dropoff(events)
-            for uid, events in events_by_user.items()
-        }
+        if fresh:
+            per_user = await _flag_values("customer_app_engagement_dropoff", resolved_user_ids)
+        else:
+            per_user = await _snapshot_flags(resolved_user_ids, "customer_app_engagement_dropoff")
         value = next(iter(per_user.values())) if len(per_user) == 1 else per_user
         return {"customer_app_engagement_dropoff": value}
     except Exception as exc:
@@ -413,11 +1102,15 @@ def engagement_dropoff_endpoint(user_id: Optional[List[str]] = Query(default=Non
 
 
 @app.get("/customer-app-retained")
-def retained_endpoint(user_id: Optional[List[str]] = Query(default=None)) -> Dict[str, Any]:
+async def retained_endpoint(
+    user_id: Optional[List[str]] = Query(default=None), fresh: bool = True
+) -> Dict[str, Any]:
     resolved_user_ids = _resolve_user_ids(user_id)
     try:
-        events_by_user = _fetch_events_by_user(resolved_user_ids)
-        per_user = {uid: customer_app_retained(events) for uid, events in events_by_user.items()}
+        if fresh:
+            per_user = await _flag_values("customer_app_retained", resolved_user_ids)
+        else:
+            per_user = await _snapshot_flags(resolved_user_ids, "customer_app_retained")
         value = next(iter(per_user.values())) if len(per_user) == 1 else per_user
         return {"customer_app_retained": value}
     except Exception as exc:
@@ -425,64 +1118,185 @@ def retained_endpoint(user_id: Optional[List[str]] = Query(default=None)) -> Dic
 
 
 @app.get("/customer-app-retained-dropoff")
-def retained_dropoff_endpoint(user_id: Optional[List[str]] = Query(default=None)) -> Dict[str, Any]:
+async def retained_dropoff_endpoint(
+    user_id: Optional[List[str]] = Query(default=None), fresh: bool = True
+) -> Dict[str, Any]:
     resolved_user_ids = _resolve_user_ids(user_id)
     try:
-        events_by_user = _fetch_events_by_user(resolved_user_ids)
-        per_user = {
-            uid: customer_app_retained_dropoff(events)
-            for uid, events in events_by_user.items()
-        }
+        if fresh:
+            per_user = await _flag_values("customer_app_retained_dropoff", resolved_user_ids)
+        else:
+            per_user = await _snapshot_flags(resolved_user_ids, "customer_app_retained_dropoff")
         value = next(iter(per_user.values())) if len(per_user) == 1 else per_user
         return {"customer_app_retained_dropoff": value}
     except Exception as exc:
         raise HTTPException(status_code=500, detail=str(exc)) from exc
 
 
-@app.get("/signals")
-def signals_summary(user_id: Optional[List[str]] = Query(default=None)) -> Dict[str, Any]:
+@app.get("/signals", response_model=None)
+async def signals_summary(
+    request: Request,
+    user_id: Optional[List[str]] = Query(default=None),
+    fresh: bool = True,
+    response_format: Optional[str] = Query(default=None, alias="format"),
+) -> Union[Dict[str, Any], Response]:
     resolved_user_ids = _resolve_user_ids(user_id)
+    body_format = _response_format(response_format, request)
     try:
+        summaries = await _summaries(
+            "signals", resolved_user_ids, build_signal_summaries_async, fresh=fresh
+        )
+        if body_format in ("bitmask", "columnar"):
+            groups = {"signals": (SIGNAL_FLAGS, list(summaries.values()))}
+            return _encoded_response(body_format, compact_payload(body_format, list(summaries), groups))
+
+        payload: Dict[str, Any] = summaries
         if len(resolved_user_ids) == 1:
             solo_id = resolved_user_ids[0]
-            summary = build_signal_summary(solo_id)
-            summary["user_id"] = solo_id
-            return summary
+            payload = summaries[solo_id]
+            payload["user_id"] = solo_id
 
-        return {uid: build_signal_summary(uid) for uid in resolved_user_ids}
+        return payload if body_format is None else _encoded_response(body_format, payload)
     except Exception as exc:
         raise HTTPException(status_code=500, detail=str(exc)) from exc
 
 
-@app.get("/milestones")
-def milestones_summary(user_id: Optional[List[str]] = Query(default=None)) -> Dict[str, Any]:
+@app.get("/milestones", response_model=None)
+async def milestones_summary(
+    request: Request,
+    user_id: Optional[List[str]] = Query(default=None),
+    fresh: bool = True,
+    response_format: Optional[str] = Query(default=None, alias="format"),
+) -> Union[Dict[str, Any], Response]:
     resolved_user_ids = _resolve_user_ids(user_id)
+    body_format = _response_format(response_format, request)
     try:
-        from milestones import build_milestone_summary
+        from milestones import MILESTONE_FLAGS
     except ImportError as exc:
         raise HTTPException(status_code=500, detail=f"milestones module unavailable: {exc}") from exc
 
     try:
-        per_user: Dict[str, Dict[str, Any]] = {}
-        for uid in resolved_user_ids:
-            signal_summary = build_signal_summary(uid)
-            milestones = build_milestone_summary(uid, signal_summary=signal_summary)
-            per_user[uid] = {
-                "user_id": uid,
-                "signals": signal_summary,
-                "milestones": milestones,
-            }
+        per_user = await _summaries(
+            "milestones", resolved_user_ids, _build_milestone_payloads, fresh=fresh
+        )
 
-        if len(per_user) == 1:
-            return next(iter(per_user.values()))
+        if body_format in ("bitmask", "columnar"):
+            groups = {
+                "signals": (SIGNAL_FLAGS, [payload["signals"] for payload in per_user.values()]),
+                "milestones": (MILESTONE_FLAGS, [payload["milestones"] for payload in per_user.values()]),
+            }
+            return _encoded_response(body_format, compact_payload(body_format, list(per_user), groups))
 
-        return per_user
+        payload = next(iter(per_user.values())) if len(per_user) == 1 else per_user
+        return payload if body_format is None else _encoded_response(body_format, payload)
     except Exception as exc:
         raise HTTPException(status_code=500, detail=str(exc)) from exc
 
 
+class BulkSignalsRequest(BaseModel):
+    user_ids: Optional[List[str]] = None
+    all_users: bool = False
+    # A UUID so a malformed value is a 422 here, not an in-band error after the 200.
+    after: Optional[UUID] = Field(
+        default=None, description="With all_users, resume after this user id (the last one received)."
+    )
+    include_milestones: bool = False
+
+
+async def _bulk_user_chunks(
+    user_ids: Optional[List[str]], after: Optional[str]
+) -> AsyncIterator[List[str]]:
+    """Yield growing chunks of ``user_ids``, or of every ``public.users`` id when it is None."""
+    chunk_size = min(BULK_FIRST_CHUNK_SIZE, BULK_CHUNK_SIZE)
+    if user_ids is None:
+        while True:
+            chunk = await asyncio.to_thread(fetch_user_ids_page, after=after, limit=chunk_size)
+            if not chunk:
+                return
+            yield chunk
+            after = chunk[-1]
+            chunk_size = min(chunk_size * 2, BULK_CHUNK_SIZE)
+    else:
+        start = 0
+        while start < len(user_ids):
+            yield user_ids[start : start + chunk_size]
+            start += chunk_size
+            chunk_size = min(chunk_size * 2, BULK_CHUNK_SIZE)
+
+
+async def _stream_bulk_signals(
+    user_ids: Optional[List[str]], *, after: Optional[str], include_milestones: bool
+) -> AsyncIterator[bytes]:
+    """Yield one NDJSON line per user, computing a chunk of users at a time."""
+    try:
+        async for chunk in _bulk_user_chunks(user_ids, after):
+            if include_milestones:
+                payloads = await _build_milestone_payloads(chunk)
+            else:
+                summaries = await build_signal_summaries_async(chunk)
+                payloads = {uid: {"user_id": uid, "signals": summaries[uid]} for uid in chunk}
+            yield "".join(json.dumps(payloads[uid]) + "\n" for uid in chunk).encode()
+    except Exception as exc:
+        # Headers are already sent, so report the failure in-band and end the stream.
+        yield (json.dumps({"error": str(exc)}) + "\n").encode()
+
+
+@app.post("/signals/bulk")
+async def bulk_signals(request: BulkSignalsRequest) -> StreamingResponse:
+    if request.all_users == bool(request.user_ids):
+        raise HTTPException(
+            status_code=400, detail="send either a non-empty user_ids list or all_users=true"
+        )
+    if request.after is not None and not request.all_users:
+        # Resuming an explicit list is done by sending the ids not received yet.
+        raise HTTPException(status_code=400, detail="after is only supported with all_users=true")
+    user_ids = None if request.all_users else _resolve_user_ids(request.user_ids)
+    after = str(request.after) if request.after is not None else None
+    stream = _stream_bulk_signals(user_ids, after=after, include_milestones=request.include_milestones)
+    return StreamingResponse(stream, media_type="application/x-ndjson")
+
+
+@app.get("/signals/changes")
+async def signal_changes(user_id: Optional[List[str]] = Query(default=None)) -> StreamingResponse:
+    """Server-sent events with the signal and milestone flags that changed, per user."""
+    if not change_feed.running:
+        raise HTTPException(
+            status_code=503,
+            detail="the change feed is off; set CHANGE_FEED_ENABLED=1 and apply migrations 005 and 008",
+        )
+    # Unlike the other endpoints, no user_id means every user, not DEFAULT_USER_ID.
+    user_ids = _resolve_user_ids(user_id) if user_id else None
+    return StreamingResponse(
+        change_feed.stream(user_ids),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint() -> PlainTextResponse:
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/cache-stats")
+async def cache_stats() -> Dict[str, Any]:
+    return {
+        **summary_cache.stats(),
+        "app_catalog": app_catalog.stats(),
+        "change_feed": change_feed.stats(),
+        "coalescing": request_coalescer.stats(),
+    }
+
+
 __all__ = [
+    "ActivityIndex",
+    "ActivityIndexBuilder",
+    "EventRow",
+    "SIGNAL_FLAGS",
     "app",
+    "build_activity_index",
+    "build_signal_summaries",
+    "build_signal_summaries_async",
     "build_signal_summary",
     "customer_app_engaged",
     "customer_app_engagement_dropoff",
@@ -490,6 +1304,18 @@ __all__ = [
     "customer_app_registration_completed",
     "customer_app_retained",
     "customer_app_retained_dropoff",
+    "evaluate_signals",
+    "fetch_activity_summaries",
+    "fetch_event_fingerprints",
+    "fetch_goal_settings",
     "fetch_events",
+    "fetch_all_user_ids",
+    "fetch_events_for_users",
+    "fetch_lifetime_activity",
+    "fetch_rollup_summaries",
+    "fetch_snapshots",
+    "fetch_user_ids_page",
     "goal_setting_completed",
+    "read_user_ids_file",
+    "stream_activity_indexes",
 ]
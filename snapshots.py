@@ -0,0 +1,193 @@
+"""Scheduled job materialising signals and milestones into public.user_signal_snapshots."""
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from psycopg2.extras import Json, execute_values
+
+import db
+from milestones import build_milestone_summaries
+from signals import LOOKBACK_WEEKS, build_signal_summaries, fetch_all_user_ids
+
+# Recorded as milestone_logs.app_id for the transitions written by this job.
+MILESTONE_LOG_APP_ID = os.getenv("MILESTONE_LOG_APP_ID", "signals-service")
+
+logger = logging.getLogger("snapshots")
+
+
+def fetch_active_user_ids(*, now: Optional[datetime] = None) -> List[str]:
+    """Users with events inside the look-back window, plus everyone already snapshotted.
+
+    Snapshotted users stay in the set so their flags (drop-offs in particular) keep
+    following the calendar after they go quiet.
+
+    The distinct users are walked with a skip scan over idx_events_user_id and each one
+    is probed once on idx_events_user_id_last_changed, so the cost follows the number of
+    users rather than the number of events in the window.
+    """
+    now = now or datetime.now(tz=timezone.utc)
+    since = (now - timedelta(weeks=LOOKBACK_WEEKS + 1)).replace(tzinfo=None)
+    query = """
+        WITH RECURSIVE event_users AS (
+            (SELECT user_id FROM public.events WHERE user_id IS NOT NULL ORDER BY user_id LIMIT 1)
+            UNION ALL
+            SELECT (
+                SELECT e.user_id FROM public.events AS e
+                WHERE e.user_id > u.user_id
+                ORDER BY e.user_id
+                LIMIT 1
+            )
+            FROM event_users AS u
+            WHERE u.user_id IS NOT NULL
+        )
+        SELECT DISTINCT user_id FROM (
+            SELECT u.user_id FROM event_users AS u
+            WHERE u.user_id IS NOT NULL
+              AND EXISTS (
+                  SELECT 1 FROM public.events AS e
+                  WHERE e.user_id = u.user_id
+                    AND COALESCE(e.updated_at, e.created_at) >= %s
+              )
+            UNION ALL
+            SELECT user_id FROM public.user_signal_snapshots
+        ) AS active
+    """
+    rows = db.execute_query(query, (since,), name="fetch_active_user_ids")
+    return sorted(row["user_id"] for row in rows)
+
+
+def _logged_milestones(cur, user_ids: Sequence[str]) -> Set[Tuple[str, str]]:
+    """(user_id, milestone_id) pairs already in milestone_logs for users without a snapshot."""
+    if not user_ids:
+        return set()
+    cur.execute(
+        """
+        SELECT u.user_id, l.milestone_id
+        FROM unnest(%s::text[]) AS u(user_id)
+        JOIN public.milestone_logs AS l ON l.user_id = u.user_id::uuid
+        """,
+        (list(user_ids),),
+    )
+    return set(cur.fetchall())
+
+
+def refresh_batch(user_ids: Sequence[str]) -> Tuple[int, int]:
+    """Recompute ``user_ids`` and write their snapshots and milestone transitions.
+
+    Each user is locked while their previous snapshot is compared and replaced, so two
+    overlapping runs never log the same transition twice, while batches of different
+    users (e.g. sweep shards) proceed in parallel. Returns the number of snapshots and
+    transitions written.
+    """
+    signal_summaries = build_signal_summaries(user_ids)
+    milestone_summaries = build_milestone_summaries(user_ids, signal_summaries=signal_summaries)
+
+    # The summaries borrow pooled connections of their own, so only take one for the
+    # write once they are done.
+    with db.connection() as conn:
+        with conn:
+            with conn.cursor() as cur:
+                # Taken in key order so overlapping batches cannot deadlock.
+                cur.execute(
+                    """
+                    SELECT pg_advisory_xact_lock(hashtext('user_signal_snapshots'), key)
+                    FROM (
+                        SELECT DISTINCT hashtext(user_id) AS key
+                        FROM unnest(%s::text[]) AS u(user_id)
+                    ) AS k
+                    ORDER BY key
+                    """,
+                    (list(user_ids),),
+                )
+                cur.execute(
+                    """
+                    SELECT user_id, milestones
+                    FROM public.user_signal_snapshots
+                    WHERE user_id = ANY(%s)
+                    """,
+                    (list(user_ids),),
+                )
+                previous: Dict[str, Dict[str, bool]] = dict(cur.fetchall())
+                first = [uid for uid in user_ids if uid not in previous and db.is_uuid(uid)]
+                logged = _logged_milestones(cur, first)
+
+                transitions = [
+                    (user_id, MILESTONE_LOG_APP_ID, milestone)
+                    for user_id, milestones in milestone_summaries.items()
+                    if db.is_uuid(user_id)
+                    for milestone, reached in milestones.items()
+                    if reached
+                    and not previous.get(user_id, {}).get(milestone)
+                    and (user_id, milestone) not in logged
+                ]
+                execute_values(
+                    cur,
+                    """
+                    INSERT INTO public.user_signal_snapshots (user_id, signals, milestones, computed_at)
+                    VALUES %s
+                    ON CONFLICT (user_id) DO UPDATE SET
+                        signals = EXCLUDED.signals,
+                        milestones = EXCLUDED.milestones,
+                        computed_at = EXCLUDED.computed_at
+                    """,
+                    [
+                        (user_id, Json(signal_summaries[user_id]), Json(milestone_summaries[user_id]))
+                        for user_id in user_ids
+                    ],
+                    template="(%s, %s, %s, now())",
+                )
+                if transitions:
+                    execute_values(
+                        cur,
+                        "INSERT INTO public.milestone_logs (user_id, app_id, milestone_id) VALUES %s",
+                        transitions,
+                        template="(%s::uuid, %s, %s)",
+                    )
+    return len(user_ids), len(transitions)
+
+
+def refresh_snapshots(user_ids: Sequence[str], *, batch_size: int = 500) -> Tuple[int, int]:
+    snapshots = transitions = 0
+    for start in range(0, len(user_ids), batch_size):
+        written, logged = refresh_batch(user_ids[start : start + batch_size])
+        snapshots += written
+        transitions += logged
+    return snapshots, transitions
+
+
+def run(*, interval: float, batch_size: int, all_users: bool = False, once: bool = False) -> None:
+    while True:
+        started = time.monotonic()
+        user_ids = fetch_all_user_ids() if all_users else fetch_active_user_ids()
+        snapshots, transitions = refresh_snapshots(user_ids, batch_size=batch_size)
+        logger.info(
+            "refreshed %s snapshots, logged %s milestone transitions in %.1fs",
+            snapshots,
+            transitions,
+            time.monotonic() - started,
+        )
+        if once:
+            return
+        time.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--interval", type=float, default=900.0, help="seconds between refresh starts")
+    parser.add_argument("--batch-size", type=int, default=500, help="users computed per transaction")
+    parser.add_argument("--all-users", action="store_true", help="refresh every row of public.users")
+    parser.add_argument("--once", action="store_true", help="exit after one refresh instead of repeating")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    db.configure_pool(1)
+    run(interval=args.interval, batch_size=args.batch_size, all_users=args.all_users, once=args.once)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""Refresh the snapshots of every public.users row across a pool of worker processes.
+
+    python sweep.py --once                       # one sweep over all users and exit
+    python sweep.py --workers 8 --shards 128     # repeat every hour (--interval seconds)
+
+Users are split into shards, by a hash of the id or by equal ranges of the UUID space.
+Each shard is refreshed by one worker process with snapshots.refresh_snapshots. Every
+worker holds a single database connection. Completed shards are checkpointed in
+public.high_watermarks, so a sweep that crashed resumes with the shards still missing.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List, NamedTuple, Set, Tuple
+
+import db
+from snapshots import refresh_snapshots
+
+WATERMARK_SOURCE = "signal_sweep"
+
+PARTITIONS = ("hash", "range")
+
+# The done-shard bitmask is stored as hex in high_watermarks.last_processed_key
+# (varchar(500)), which leaves room for this many shards.
+MAX_SHARDS = 1024
+
+logger = logging.getLogger("sweep")
+
+
+class ShardResult(NamedTuple):
+    shard: int
+    users: int
+    snapshots: int
+    transitions: int
+    seconds: float
+
+
+def shard_user_ids(partition: str, shards: int, shard: int) -> List[str]:
+    """Ids of the ``public.users`` rows in ``shard`` of ``shards``, in id order."""
+    if partition == "hash":
+        query = """
+            SELECT id::text AS user_id
+            FROM public.users
+            WHERE (hashtext(id::text) & 2147483647) %% %s = %s
+            ORDER BY id
+        """
+        params: Tuple[Any, ...] = (shards, shard)
+    else:
+        lower = str(uuid.UUID(int=(1 << 128) * shard // shards))
+        upper = str(uuid.UUID(int=(1 << 128) * (shard + 1) // shards)) if shard + 1 < shards else None
+        query = """
+            SELECT id::text AS user_id
+            FROM public.users
+            WHERE id >= %s::uuid AND (%s::uuid IS NULL OR id < %s::uuid)
+            ORDER BY id
+        """
+        params = (lower, upper, upper)
+    return [row["user_id"] for row in db.execute_query(query, params, name="shard_user_ids")]
+
+
+def _init_worker() -> None:
+    db.configure_pool(1)
+
+
+def sweep_shard(partition: str, shards: int, shard: int, batch_size: int) -> ShardResult:
+    """Worker entry point: refresh every user of one shard."""
+    started = time.monotonic()
+    user_ids = shard_user_ids(partition, shards, shard)
+    snapshots, transitions = refresh_snapshots(user_ids, batch_size=batch_size)
+    return ShardResult(shard, len(user_ids), snapshots, transitions, time.monotonic() - started)
+
+
+def _read_checkpoint(cur, source: str, partition: str, shards: int) -> Set[int]:
+    key = db.lock_watermark_key(cur, source)
+    if key == "0":
+        return set()
+    checkpoint = json.loads(key)
+    if checkpoint["partition"] != partition or checkpoint["shards"] != shards:
+        return set()
+    done = int(checkpoint["done"], 16)
+    return {shard for shard in range(shards) if done >> shard & 1}
+
+
+def _write_checkpoint(cur, source: str, partition: str, shards: int, done: Set[int]) -> None:
+    mask = sum(1 << shard for shard in done)
+    checkpoint = {"partition": partition, "shards": shards, "done": format(mask, "x")}
+    db.advance_watermark(cur, source, json.dumps(checkpoint, separators=(",", ":")))
+
+
+def load_checkpoint(source: str, partition: str, shards: int) -> Set[int]:
+    """Shards already completed by an unfinished sweep with the same layout.
+
+    A finished sweep, or one with a different partitioning, starts over.
+    """
+    with db.connection() as conn:
+        with conn:
+            with conn.cursor() as cur:
+                done = _read_checkpoint(cur, source, partition, shards)
+                if len(done) == shards:
+                    done = set()
+                    _write_checkpoint(cur, source, partition, shards, done)
+    return done
+
+
+def mark_done(source: str, partition: str, shards: int, shard: int) -> None:
+    with db.connection() as conn:
+        with conn:
+            with conn.cursor() as cur:
+                done = _read_checkpoint(cur, source, partition, shards)
+                done.add(shard)
+                _write_checkpoint(cur, source, partition, shards, done)
+
+
+def sweep(
+    *,
+    workers: int,
+    shards: int,
+    partition: str = "hash",
+    batch_size: int = 500,
+    source: str = WATERMARK_SOURCE,
+) -> bool:
+    """Refresh every shard not checkpointed yet. Returns False when a shard failed."""
+    started = time.monotonic()
+    done = load_checkpoint(source, partition, shards)
+    pending = [shard for shard in range(shards) if shard not in done]
+    if done:
+        logger.info("resuming sweep: %s of %s shards already done", len(done), shards)
+
+    users = snapshots = transitions = 0
+    failed = 0
+    # Workers are spawned rather than forked so they never share this process's connections.
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(
+        max_workers=workers, mp_context=context, initializer=_init_worker
+    ) as executor:
+        futures: Dict[Future, int] = {
+            executor.submit(sweep_shard, partition, shards, shard, batch_size): shard for shard in pending
+        }
+        for future in as_completed(futures):
+            shard = futures[future]
+            try:
+                result = future.result()
+            except Exception:
+                failed += 1
+                logger.exception("shard %s failed; it is retried by the next sweep", shard)
+                continue
+            mark_done(source, partition, shards, shard)
+            done.add(shard)
+            users += result.users
+            snapshots += result.snapshots
+            transitions += result.transitions
+            elapsed = time.monotonic() - started
+            logger.info(
+                "shard %s: %s users in %.1fs; %s/%s shards done, %s users at %.0f users/s",
+                shard,
+                result.users,
+                result.seconds,
+                len(done),
+                shards,
+                users,
+                users / elapsed if elapsed else 0.0,
+            )
+
+    elapsed = time.monotonic() - started
+    logger.info(
+        "swept %s users (%s snapshots, %s milestone transitions) in %.1fs at %.0f users/s"
+        " with %s workers; %s shards failed",
+        users,
+        snapshots,
+        transitions,
+        elapsed,
+        users / elapsed if elapsed else 0.0,
+        workers,
+        failed,
+    )
+    return not failed
+
+
+def run(*, interval: float, once: bool = False, **options) -> bool:
+    while True:
+        started = time.monotonic()
+        succeeded = sweep(**options)
+        if once:
+            return succeeded
+        time.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument("--shards", type=int, default=64, help=f"shards per sweep (at most {MAX_SHARDS})")
+    parser.add_argument("--partition", choices=PARTITIONS, default="hash", help="how users map to shards")
+    parser.add_argument("--batch-size", type=int, default=500, help="users computed per transaction")
+    parser.add_argument(
+        "--source", default=WATERMARK_SOURCE, help="high_watermarks source of the checkpoint"
+    )
+    parser.add_argument("--interval", type=float, default=3600.0, help="seconds between sweep starts")
+    parser.add_argument("--once", action="store_true", help="exit after one sweep instead of repeating")
+    args = parser.parse_args()
+    if not 1 <= args.shards <= MAX_SHARDS:
+        parser.error(f"--shards must be between 1 and {MAX_SHARDS}")
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    # This process only reads and writes the checkpoint row.
+    db.configure_pool(1)
+    succeeded = run(
+        interval=args.interval,
+        once=args.once,
+        workers=max(1, args.workers),
+        shards=args.shards,
+        partition=args.partition,
+        batch_size=args.batch_size,
+        source=args.source,
+    )
+    if not succeeded:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
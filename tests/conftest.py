@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The service modules live at the repository root and db.py refuses to import without
+# DATABASE_URL. These tests never connect; the pool is only created on first use.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "postgresql://localhost/signals_test")
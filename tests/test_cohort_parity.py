@@ -0,0 +1,237 @@
+"""cohort.evaluate_cohort_events must agree with build_activity_index + evaluate_signals."""
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pd = pytest.importorskip("pandas")
+
+import cohort  # noqa: E402
+from signals import _event_time, _minutes_played, build_activity_index, evaluate_signals  # noqa: E402
+
+NOW = datetime(2024, 5, 15, 12, 30, 15, tzinfo=timezone.utc)
+
+Row = Dict[str, Any]
+
+
+def _event(user_id: str, **fields: Any) -> Row:
+    row: Row = dict.fromkeys(cohort.EVENT_COLUMNS)
+    row.update(user_id=user_id, **fields)
+    return row
+
+
+def _frame(rows: Sequence[Row]) -> pd.DataFrame:
+    # The same construction as load_cohort_events, from rows shaped like psycopg2's.
+    return pd.DataFrame.from_records(
+        [tuple(row[column] for column in cohort.EVENT_COLUMNS) for row in rows],
+        columns=list(cohort.EVENT_COLUMNS),
+    )
+
+
+def _assert_parity(rows: Sequence[Row], *, user_ids: Optional[Sequence[str]] = None) -> None:
+    frame = cohort.evaluate_cohort_events(_frame(rows), user_ids=user_ids, now=NOW)
+    by_user: Dict[str, List[Row]] = {}
+    for row in rows:
+        by_user.setdefault(row["user_id"], []).append(row)
+
+    for user_id in user_ids if user_ids is not None else by_user:
+        index = build_activity_index(by_user.get(user_id, []), now=NOW)
+        expected = evaluate_signals(index)
+        actual = frame.loc[user_id]
+        assert set(expected) == set(cohort.EVENT_FLAG_COLUMNS)
+        assert {name: bool(actual[name]) for name in expected} == expected, user_id
+        assert actual["event_count"] == index.event_count, user_id
+        assert actual["max_minutes"] == pytest.approx(index.max_minutes), user_id
+        assert actual["recent_sessions"] == index.recent_sessions, user_id
+        active = sum(1 << week for week, sessions in enumerate(index.weekly_sessions) if sessions)
+        assert actual["activity_mask"] == active, user_id
+
+
+def _epoch(moment: datetime) -> float:
+    return moment.timestamp()
+
+
+TIMESTAMP_ENCODINGS = {
+    "event_ts": {"event_ts": NOW - timedelta(days=3)},
+    "event_ts_over_raw": {
+        "event_ts": NOW - timedelta(days=40),
+        "last_time_used": int(_epoch(NOW - timedelta(days=1))),
+    },
+    "epoch_seconds": {"last_time_used": int(_epoch(NOW - timedelta(days=8, hours=3)))},
+    "epoch_milliseconds": {"last_time_used": int(_epoch(NOW - timedelta(days=15)) * 1000) + 123},
+    "epoch_out_of_range": {
+        "last_time_used": 300_000_000_000,
+        "created_at": (NOW - timedelta(days=2)).replace(tzinfo=None),
+    },
+    "formatted_space": {"last_time_used_formatted": "2024-05-10 08:15:00"},
+    "formatted_t": {"last_time_used_formatted": "2024-05-01T23:59:59"},
+    "formatted_fraction": {"last_time_used_formatted": "2024-04-20T06:00:00.250000"},
+    "formatted_short_fraction": {"last_time_used_formatted": "2024-04-20T06:00:00.5"},
+    "formatted_single_digits": {"last_time_used_formatted": "2024-5-9 7:5:3"},
+    "formatted_invalid_day": {
+        "last_time_used_formatted": "2024-02-30 10:00:00",
+        "date": "2024-05-12",
+    },
+    "formatted_garbage": {"last_time_used_formatted": "yesterday", "date": "13/05/2024"},
+    "formatted_empty": {"last_time_used_formatted": "", "date": "2024-04-01"},
+    "date_iso": {"date": "2024-03-20"},
+    "date_day_first": {"date": "07/05/2024"},
+    "date_invalid": {"date": "31/02/2024", "updated_at": (NOW - timedelta(days=9)).replace(tzinfo=None)},
+    "created_at": {"created_at": (NOW - timedelta(days=22)).replace(tzinfo=None)},
+    "updated_at_only": {"updated_at": (NOW - timedelta(days=5)).replace(tzinfo=None)},
+    "created_before_updated": {
+        "created_at": (NOW - timedelta(days=60)).replace(tzinfo=None),
+        "updated_at": (NOW - timedelta(days=1)).replace(tzinfo=None),
+    },
+    "future": {"last_time_used": int(_epoch(NOW + timedelta(days=2)))},
+    "unparseable": {"last_time_used_formatted": "n/a", "date": "soon"},
+}
+
+
+@pytest.mark.parametrize("name", sorted(TIMESTAMP_ENCODINGS))
+def test_event_seconds_match_event_time(name: str) -> None:
+    row = _event("user", id=1, session_id="s", total_time_in_foreground=5, **TIMESTAMP_ENCODINGS[name])
+    expected = _event_time(row)
+    (seconds,) = cohort.event_seconds(_frame([row]))
+    if expected is None:
+        assert np.isnan(seconds)
+    else:
+        assert seconds == pytest.approx(expected.timestamp(), abs=1e-3)
+
+
+def test_timestamp_encodings() -> None:
+    rows = []
+    for number, (name, fields) in enumerate(sorted(TIMESTAMP_ENCODINGS.items()), start=1):
+        session = f"{name}-a"
+        rows.append(_event(name, id=number, session_id=session, total_time_in_foreground=6, **fields))
+        # A second event of the same session at the same moment must not add a session.
+        rows.append(_event(name, id=number + 100, session_id=session, foreground_minutes=2.5, **fields))
+    _assert_parity(rows)
+
+
+MINUTE_ENCODINGS = [
+    {"foreground_minutes": 3.0},
+    {"foreground_minutes": 0.0, "total_time_in_foreground_minutes": 9},
+    {"total_time_in_foreground_minutes": 4},
+    {"total_time_in_foreground_minutes": 0, "total_time_in_foreground": 2},
+    {"total_time_in_foreground_minutes": -1, "total_time_in_foreground_ms": 90_000},
+    {"total_time_in_foreground": 0, "total_time_in_foreground_ms": 30_000},
+    {"total_time_in_foreground_ms": 0},
+    {},
+]
+
+
+@pytest.mark.parametrize("fields", MINUTE_ENCODINGS)
+def test_event_minutes_match_minutes_played(fields: Row) -> None:
+    row = _event("user", id=1, **fields)
+    (minutes,) = cohort.event_minutes(_frame([row]))
+    assert minutes == pytest.approx(_minutes_played(row))
+
+
+def test_missing_session_ids() -> None:
+    recent = NOW - timedelta(days=1)
+    last_week, two_weeks_ago = recent - timedelta(days=8), recent - timedelta(days=15)
+    rows = [
+        # Falls back to the event id.
+        _event("no-session", id=11, session_id=None, event_ts=recent, foreground_minutes=2.0),
+        _event("no-session", id=12, session_id="", event_ts=recent, foreground_minutes=2.0),
+        # Neither a session nor an id: not a recent session, but "unknown-session" for weeks.
+        _event("anonymous", id=None, session_id=None, event_ts=recent, foreground_minutes=2.0),
+        _event("anonymous", id=0, session_id="", event_ts=last_week, foreground_minutes=1.0),
+        _event("anonymous", id=0, session_id=None, event_ts=two_weeks_ago, foreground_minutes=1.0),
+        # A session id that looks like another event's id is the same session key.
+        _event("collision", id=7, session_id=None, event_ts=recent, foreground_minutes=1.0),
+        _event("collision", id=8, session_id="7", event_ts=recent, foreground_minutes=1.0),
+        _event("collision", id=9, session_id="x", event_ts=recent, foreground_minutes=1.0),
+        _event("collision", id=10, session_id="y", event_ts=recent, foreground_minutes=0.0),
+    ]
+    _assert_parity(rows)
+
+
+@pytest.mark.parametrize("week", range(0, cohort.LOOKBACK_WEEKS + 1))
+@pytest.mark.parametrize("offset", [-1, 0, 1, -1000, 999])
+def test_week_boundaries(week: int, offset: int) -> None:
+    # ``offset`` in milliseconds around the start of each rolling week.
+    boundary = NOW - timedelta(weeks=week, milliseconds=offset)
+    naive_boundary = boundary.replace(tzinfo=None)
+    rows = [
+        _event("stored", id=1, session_id="a", event_ts=boundary, foreground_minutes=1.0),
+        _event(
+            "millis",
+            id=2,
+            session_id="a",
+            last_time_used=round(boundary.timestamp() * 1000),
+            total_time_in_foreground=1,
+        ),
+        _event(
+            "formatted",
+            id=3,
+            session_id="a",
+            last_time_used_formatted=boundary.strftime("%Y-%m-%dT%H:%M:%S.%f"),
+            total_time_in_foreground=1,
+        ),
+        _event("created", id=4, session_id="a", created_at=naive_boundary, foreground_minutes=1.0),
+        # Midnight UTC of the boundary's day.
+        _event("date", id=5, session_id="a", date=f"{boundary:%Y-%m-%d}", foreground_minutes=1.0),
+    ]
+    _assert_parity(rows)
+
+
+def test_users_without_events() -> None:
+    an_hour_ago = NOW - timedelta(hours=1)
+    rows = [_event("active", id=1, session_id="a", event_ts=an_hour_ago, foreground_minutes=5.0)]
+    _assert_parity(rows, user_ids=["active", "silent", "active"])
+
+
+def _random_event(
+    rng: random.Random, user_id: str, number: int, moment: Optional[datetime] = None
+) -> Row:
+    if moment is None:
+        moment = NOW - timedelta(seconds=rng.uniform(-2 * 86400, 12 * 7 * 86400))
+    fields: Row = {"id": rng.choice([number, number, 0, None])}
+    fields["session_id"] = rng.choice([None, "", f"s{rng.randrange(6)}", str(rng.randrange(1, 4))])
+    encoding = rng.randrange(7)
+    if encoding == 0:
+        fields["event_ts"] = moment
+    elif encoding == 1:
+        fields["last_time_used"] = int(moment.timestamp())
+    elif encoding == 2:
+        fields["last_time_used"] = int(moment.timestamp() * 1000)
+    elif encoding == 3:
+        fmt = rng.choice(["%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%dT%H:%M:%S.%f"])
+        fields["last_time_used_formatted"] = moment.strftime(fmt)
+    elif encoding == 4:
+        fields["date"] = moment.strftime(rng.choice(["%Y-%m-%d", "%d/%m/%Y"]))
+    elif encoding == 5:
+        fields["created_at"] = moment.replace(tzinfo=None)
+        fields["updated_at"] = (moment + timedelta(days=1)).replace(tzinfo=None)
+    else:
+        fields["updated_at"] = moment.replace(tzinfo=None)
+
+    minutes = rng.randrange(5)
+    if minutes == 0:
+        fields["foreground_minutes"] = rng.choice([0.0, 0.5, 4.0])
+    elif minutes == 1:
+        fields["total_time_in_foreground_minutes"] = rng.choice([0, 1, 5])
+    elif minutes == 2:
+        fields["total_time_in_foreground"] = rng.choice([0, 2])
+    elif minutes == 3:
+        fields["total_time_in_foreground_ms"] = rng.choice([0, 45_000, 250_000])
+    return _event(user_id, **fields)
+
+
+def test_random_cohort() -> None:
+    rng = random.Random(20240515)
+    rows: List[Row] = []
+    for user in range(300):
+        for _ in range(rng.randrange(0, 25)):
+            rows.append(_random_event(rng, f"user-{user}", len(rows) + 1))
+    # Users active about every other day, so the multi-week flags are true for some.
+    for user in range(40):
+        for day in range(0, 11 * 7, 2):
+            moment = NOW - timedelta(days=day, seconds=rng.uniform(0, 2 * 86400))
+            rows.append(_random_event(rng, f"regular-{user}", len(rows) + 1, moment))
+    _assert_parity(rows)
+    assert cohort.check_parity(_frame(rows), now=NOW).empty